@@ -19,6 +19,7 @@
 declare -a APIS=('cloudfunctions.googleapis.com'
                  'firestore.googleapis.com'
                  'aiplatform.googleapis.com'
+                 'eventarc.googleapis.com'
                 )
 
 function deploy_cloud_function() {
@@ -49,6 +50,23 @@ function deploy_cloud_function() {
     --source functions/cut_video/ \
     --timeout=600s \
     --trigger-http
+
+  echo ">> Deploying process_cut_job Cloud Function"
+  gcloud functions deploy process_cut_job \
+    --gen2 \
+    --project ${PROJECT} \
+    --set-env-vars GCCLOUD_PROJECT=${PROJECT},BUCKET=${BUCKET} \
+    --region us-central1 \
+    --runtime python312 \
+    --entry-point process_cut_job \
+    --memory 4Gi \
+    --cpu 2 \
+    --source functions/cut_video/ \
+    --timeout=540s \
+    --trigger-location ${FIRESTORE_LOCATION} \
+    --trigger-event-filters type=google.cloud.firestore.document.v1.created \
+    --trigger-event-filters database='(default)' \
+    --trigger-event-filters-path-pattern document='cut_jobs/{jobId}'
 }
 
 function enable_apis() {
@@ -73,9 +91,11 @@ function deploy() {
 
 read -p "Enter a Cloud Project id: " PROJECT
 read -p "Provide cloud storage bucket: " BUCKET
+read -p "Enter the Firestore location (e.g. nam5): " FIRESTORE_LOCATION
 
 echo "* PROJECT ID: ${PROJECT}"
 echo "* Cloud Storage bucket: ${BUCKET}"
+echo "* Firestore location: ${FIRESTORE_LOCATION}"
 
 deploy
 
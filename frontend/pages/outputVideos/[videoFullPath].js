@@ -30,6 +30,10 @@ function OutputVideos() {
   const isGeneratingVideos = store.get('isGeneratingVideos');
   const filename = store.get('inputVideoFilename');
   const videos = store.get('outputVideos');
+  const cutProgress = store.get('cutProgress');
+  const cutStage = ['upload', 'encode', 'download'].find(
+    (stage) => cutProgress[stage] != null,
+  );
   const title = `${filename != null && filename + ' | '}Output Videos`;
   const transcripts = store.get('summarizedTranscripts');
 
@@ -53,6 +57,8 @@ function OutputVideos() {
       {isGeneratingVideos && (
         <div className={clsx('loadingEllipsis', styles.loadingText)}>
           Generating video
+          {cutStage &&
+            ` (${cutStage} ${Math.round(cutProgress[cutStage] * 100)}%)`}
         </div>
       )}
 
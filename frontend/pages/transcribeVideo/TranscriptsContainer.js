@@ -25,6 +25,10 @@ function TranscriptsContainer({playerRef}) {
   const transcripts = store.get('reviewTranscripts');
   const isTranscribingVideo = store.get('isTranscribingVideo');
   const isTranscriptInEdit = store.get('isTranscriptInEdit');
+  // Lines streamed while the video is transcribed, shown read only.
+  const partialTranscripts = store.get('partialTranscripts');
+  const hasPartialTranscripts =
+    isTranscribingVideo && partialTranscripts.length > 0;
 
   return (
     <div className={styles.transcriptsContainer}>
@@ -51,7 +55,20 @@ function TranscriptsContainer({playerRef}) {
         </>
       )}
       <div className={styles.transcriptBody}>
-        {(isTranscribingVideo ? new Array(8).fill({}) : transcripts).map(
+        {hasPartialTranscripts &&
+          partialTranscripts.map((transcript, index) => (
+            <TranscriptRow
+              index={index}
+              key={`${index}-${transcript.startTime}`}
+              playerRef={playerRef}
+              transcript={transcript}
+              transcriptKey="partialTranscripts"
+            />
+          ))}
+        {(isTranscribingVideo
+          ? new Array(hasPartialTranscripts ? 2 : 8).fill({})
+          : transcripts
+        ).map(
           (transcript, index) => (
             <TranscriptRow
               canKeepTranscripts
@@ -18,6 +18,14 @@
  * @fileoverview Undux subscribiptions. Most http requests would be called here.
  */
 
+import {
+  collection,
+  doc,
+  getFirestore,
+  onSnapshot,
+  orderBy,
+  query,
+} from 'firebase/firestore';
 import {getDownloadURL, getStorage, ref, uploadBytes} from 'firebase/storage';
 import {createFirebaseApp} from '../firebase/clientApp';
 import {
@@ -29,15 +37,55 @@ import {
 import {getFilenameFromFullPath} from '../fetchData/cloudStorage';
 
 const INPUT_VIDEOS_FOLDER = 'videos/';
+const CUT_JOBS_COLLECTION = 'cut_jobs';
+// Asynchronous cuts need the process_cut_job trigger, see deploy_functions.sh.
+const IS_CUT_ASYNC = process.env.NEXT_PUBLIC_CUT_VIDEO_ASYNC === 'true';
+// Chunked recognition streams the transcript pages while a video is
+// transcribed, see transcribe_video.
+const IS_TRANSCRIBE_CHUNKED =
+  process.env.NEXT_PUBLIC_TRANSCRIBE_CHUNKED === 'true';
+const TRANSCRIPTS_COLLECTION = 'transcripts';
 
 const effects = (store) => {
+  /**
+   * Shows the transcript pages written while the video is transcribed.
+   * @param {string} fileName The file name of the transcript document.
+   * @return {function()} Stops the subscription.
+   */
+  const watchTranscriptPages = (fileName) =>
+    onSnapshot(
+      query(
+        collection(getFirestore(), TRANSCRIPTS_COLLECTION, fileName, 'pages'),
+        orderBy('index'),
+      ),
+      (snapshot) => {
+        // The pages are deleted once the transcript is stored.
+        if (snapshot.empty) return;
+        store.set('partialTranscripts')(
+          snapshot.docs.flatMap((page) => page.data().lines),
+        );
+      },
+      (error) => {
+        console.error(error);
+      },
+    );
+
   const transcribeVideo = (callback) => {
     const inputVideoFullPath = store.get('inputVideoFullPath');
     const language = store.get('language');
+    const fileName = getFilenameFromFullPath(inputVideoFullPath);
+    store.set('partialTranscripts')([]);
+    const unsubscribe = IS_TRANSCRIBE_CHUNKED
+      ? watchTranscriptPages(fileName)
+      : () => {};
     callTranscribeVideo({
       full_path: inputVideoFullPath,
-      file_name: getFilenameFromFullPath(inputVideoFullPath),
+      file_name: fileName,
       language_code: language,
+      ...(IS_TRANSCRIBE_CHUNKED && {
+        recognize_mode: 'chunked',
+        stream_pages: true,
+      }),
     })
       .then((result) => {
         store.set('reviewTranscripts')(result.data.transcript);
@@ -48,6 +96,8 @@ const effects = (store) => {
         store.set('transcriptionError')(error);
       })
       .finally(() => {
+        unsubscribe();
+        store.set('partialTranscripts')([]);
         store.set('isTranscribingVideo')(false);
       });
   };
@@ -200,6 +250,60 @@ const effects = (store) => {
     }
   });
 
+  /**
+   * Resolves the download URLs of the output videos of a cut.
+   * @param {!Object} outputPaths The storage paths returned by cut_video.
+   */
+  const setOutputVideos = (outputPaths) => {
+    const {full_path: fullPath, full_path_vertical: fullPathVertical} =
+      outputPaths;
+    const promises = [
+      getDownloadURL(ref(getStorage(), fullPath)).then((url) => ({
+        url,
+        fullPath,
+      })),
+    ];
+    if (fullPathVertical) {
+      promises.push(
+        getDownloadURL(ref(getStorage(), fullPathVertical)).then((url) => ({
+          url,
+          fullPath: fullPathVertical,
+        })),
+      );
+    }
+    Promise.all(promises).then((outputVideos) => {
+      store.set('outputVideos')(outputVideos);
+    });
+  };
+
+  /**
+   * Follows a cut job until it is done or failed.
+   * @param {string} jobId The id of the job in the cut_jobs collection.
+   */
+  const watchCutJob = (jobId) => {
+    const unsubscribe = onSnapshot(
+      doc(getFirestore(), CUT_JOBS_COLLECTION, jobId),
+      (snapshot) => {
+        const job = snapshot.data();
+        if (!job) return;
+        store.set('cutProgress')(job.progress || {});
+        if (job.status === 'done' || job.status === 'failed') {
+          unsubscribe();
+          if (job.status === 'done') {
+            setOutputVideos(job.result);
+          } else {
+            console.error(job.error);
+          }
+          store.set('isGeneratingVideos')(false);
+        }
+      },
+      (error) => {
+        console.error(error);
+        store.set('isGeneratingVideos')(false);
+      },
+    );
+  };
+
   /**
    * Generate the output videos when isGeneratingVideos is true.
    */
@@ -208,38 +312,24 @@ const effects = (store) => {
       const inputVideoFullPath = store.get('inputVideoFullPath');
       const summarizedTranscripts = store.get('summarizedTranscripts');
       const inputVideoUrl = store.get('inputVideoURL');
+      store.set('cutProgress')({});
       callCutVideo({
         fileName: getFilenameFromFullPath(inputVideoFullPath),
+        fullPath: inputVideoFullPath,
         videoUrl: inputVideoUrl,
         transcript: summarizedTranscripts,
+        async: IS_CUT_ASYNC,
       })
         .then((result) => {
-          const {full_path: fullPath, full_path_vertical: fullPathVertical} =
-            result.data;
-          const promises = [
-            getDownloadURL(ref(getStorage(), fullPath)).then((url) => ({
-              url,
-              fullPath,
-            })),
-          ];
-          if (fullPathVertical) {
-            promises.push(
-              getDownloadURL(ref(getStorage(), fullPathVertical)).then(
-                (url) => ({
-                  url,
-                  fullPath: fullPathVertical,
-                }),
-              ),
-            );
+          if (IS_CUT_ASYNC) {
+            watchCutJob(result.data.jobId);
+            return;
           }
-          Promise.all(promises).then((outputVideos) => {
-            store.set('outputVideos')(outputVideos);
-          });
+          setOutputVideos(result.data);
+          store.set('isGeneratingVideos')(false);
         })
         .catch((error) => {
           console.error(error);
-        })
-        .finally(() => {
           store.set('isGeneratingVideos')(false);
         });
     }
@@ -20,6 +20,7 @@ import effects from './AdClipEffects';
 const initialState = {
   areTimestampsInEdit: false,
   clipEndTime: null,
+  cutProgress: {},
   files: [],
   inputVideoFullPath: null,
   inputVideoURL: null,
@@ -36,6 +37,7 @@ const initialState = {
   maxDuration: 40,
   minDuration: 20,
   outputVideos: [],
+  partialTranscripts: [],
   prompt: '',
   reviewTranscripts: [],
   selectedFilesForUpload: [],
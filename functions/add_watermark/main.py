@@ -11,12 +11,16 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
 import functions_framework
 from firebase_functions import https_fn, options
-import requests
 import subprocess
 from google.cloud import storage
 import os
+import time
+import media_cache
+import watermark_assets
 
 TMP_FOLDER = '/tmp/'
 OUTPUT_FOLDER = 'output/'
@@ -26,6 +30,8 @@ BUCKET_FOLDER = f'{BUCKET_ID}/watermark'
 STORAGE_HOST = 'https://storage.googleapis.com'
 ADCLIP_WATERMARK_URI = f'{STORAGE_HOST}/{BUCKET_FOLDER}/adclip.png'
 ADCLIP_WATERMARK_URI_SMALL = f'{STORAGE_HOST}/{BUCKET_FOLDER}/adclip_small.png'
+# Downloads, ffmpeg jobs and uploads of one request share this many workers.
+MAX_WORKERS = os.cpu_count() or 1
 
 # Initialize a client
 storage_client = storage.Client(PROJECT_ID)
@@ -33,27 +39,32 @@ storage_client = storage.Client(PROJECT_ID)
 bucket = storage_client.get_bucket(BUCKET_ID)
 
 
-def upload_blob(source_file_name: str, destination_blob_name: str) -> None:
+def upload_blob(
+    source_file_name: str,
+    destination_blob_name: str,
+    remove_source: bool = True
+) -> None:
   blob = bucket.blob(destination_blob_name)
   blob.upload_from_filename(source_file_name)
   print(f'File {source_file_name} uploaded to {destination_blob_name}.')
-  os.remove(source_file_name)
-
-
-# Download watermarks
-def download_watermark(url: str, path: str) -> None:
-  watermark_request = requests.get(url)
-  with open(path, 'wb') as file:
-    file.write(watermark_request.content)
-
-
-def apply_watermark(input_path: str, watermark_path: str) -> None:
-  cmd = (
-    f'ffmpeg -i {input_path} -i {watermark_path}'
-    f' -filter_complex 'overlay=10:10' '
-    f'-codec:a copy -preset ultrafast -async 1 {output_path}'
-    )
-  subprocess.check_output(cmd, shell=True)
+  if remove_source:
+    os.remove(source_file_name)
+
+
+def apply_watermark(
+    input_path: str, watermark_path: str, output_path: str
+) -> None:
+  # No shell, the paths contain the file name of the request.
+  subprocess.run(
+    [
+      'ffmpeg', '-y', '-i', input_path, '-i', watermark_path,
+      '-filter_complex', 'overlay=10:10',
+      '-codec:a', 'copy', '-preset', 'ultrafast', '-async', '1',
+      output_path
+    ],
+    check=True,
+    capture_output=True
+  )
 
 
 @https_fn.on_call(timeout_sec=600, memory=options.MemoryOption.GB_4, cpu=2,
@@ -73,51 +84,89 @@ def add_watermark(request: https_fn.CallableRequest) -> any:
   file_path_landscape = request_json['full_path']
   file_path_vertical = request_json['full_path_vertical']
 
-  video_output_path = f'{TMP_FOLDER}output_916_no_wm.mp4'
-  video_output_path_original = f'{TMP_FOLDER}output_original_no_wm.mp4'
-
-  # Download the files
-  blob = bucket.blob(file_path_vertical)
-  blob_landscape = bucket.blob(file_path_landscape)
-  blob.download_to_filename(video_output_path)
-  blob_landscape.download_to_filename(video_output_path_original)
-
-  watermark_urls = [
-    (ADCLIP_WATERMARK_URI,f'{TMP_FOLDER}adclip_watermark.png'),
-    (ADCLIP_WATERMARK_URI_SMALL, f'{TMP_FOLDER}adclip_watermark_small.png')
-  ]
-
-  for url, path in watermark_urls:
-    download_watermark(url, path)
-
-  video_output_path_final = f'{TMP_FOLDER}output_916.mp4'
-  video_output_path_original_final = f'{TMP_FOLDER}output_original.mp4'
-
-  apply_watermark(video_output_path,
-                  f'{TMP_FOLDER}adclip_watermark_small.png',
-                  video_output_path_final
-  )
-  apply_watermark(video_output_path_original,
-                  f'{TMP_FOLDER}adclip_watermark.png',
-                  video_output_path_original_final
-  )
-
-  # Upload files with and without watermark
-  paths_to_upload = [
-    (video_output_path_final, f'{OUTPUT_FOLDER}vertical_' + file_name),
-    (
-      video_output_path_original_final,
-      f'{OUTPUT_FOLDER}landscape_' + file_name
-    ),
-    (video_output_path, f'{OUTPUT_FOLDER}nowm_vertical_' + file_name),
-    (video_output_path_original, f'{OUTPUT_FOLDER}nowm_landscape_' + file_name)
-  ]
-
-  for path, destination in paths_to_upload:
-    upload_blob(path, destination)
-
+  timings = {}
+  video_output_path_final = f'{TMP_FOLDER}output_916_{file_name}'
+  video_output_path_original_final = f'{TMP_FOLDER}output_original_{file_name}'
+
+  with (
+    contextlib.ExitStack() as stack,
+    ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor
+  ):
+    # Download the files, the media cache keeps them for retried requests
+    start = time.perf_counter()
+    downloads = [
+      executor.submit(
+        stack.enter_context,
+        media_cache.cached_blob(bucket.blob(path), '.mp4')
+      )
+      for path in (file_path_vertical, file_path_landscape)
+    ]
+    video_output_path, video_output_path_original = [
+      download.result() for download in downloads
+    ]
+
+    # The watermark images are cached per instance
+    watermark_downloads = [
+      executor.submit(
+        lambda uri, path: watermark_assets.get_watermark(
+          uri, watermark_assets.probe_width(path)
+        ),
+        uri,
+        path
+      )
+      for uri, path in (
+        (ADCLIP_WATERMARK_URI_SMALL, video_output_path),
+        (ADCLIP_WATERMARK_URI, video_output_path_original)
+      )
+    ]
+    watermark_path_small, watermark_path = [
+      download.result() for download in watermark_downloads
+    ]
+    timings['download'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    watermarks = [
+      executor.submit(apply_watermark,
+                      video_output_path,
+                      watermark_path_small,
+                      video_output_path_final),
+      executor.submit(apply_watermark,
+                      video_output_path_original,
+                      watermark_path,
+                      video_output_path_original_final)
+    ]
+    for watermark in watermarks:
+      watermark.result()
+    timings['watermark'] = time.perf_counter() - start
+
+    # Upload files with and without watermark
+    start = time.perf_counter()
+    paths_to_upload = [
+      (video_output_path_final, f'{OUTPUT_FOLDER}vertical_' + file_name, True),
+      (
+        video_output_path_original_final,
+        f'{OUTPUT_FOLDER}landscape_' + file_name,
+        True
+      ),
+      (video_output_path, f'{OUTPUT_FOLDER}nowm_vertical_' + file_name, False),
+      (
+        video_output_path_original,
+        f'{OUTPUT_FOLDER}nowm_landscape_' + file_name,
+        False
+      )
+    ]
+    uploads = [
+      executor.submit(upload_blob, path, destination, remove_source)
+      for path, destination, remove_source in paths_to_upload
+    ]
+    for upload in uploads:
+      upload.result()
+    timings['upload'] = time.perf_counter() - start
+
+  print(f'Watermark timings: {timings}')
   response_status = {
-    'status': 'success'
+    'status': 'success',
+    'timings': timings
   }
 
   return response_status
@@ -0,0 +1,179 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the 'License');
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an 'AS IS' BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Content-addressed cache of downloaded media in the instance's /tmp.
+
+Entries are keyed by the content version of the source (the GCS generation
+and md5 of a blob, or the ETag of a URL), so a warm instance reuses a file
+for as long as the source is unchanged. The least recently used entries are
+evicted once the cache grows past MAX_BYTES. /tmp is in-memory on Cloud
+Functions, so the budget is kept well below the instance memory.
+
+The same module is deployed with every function that downloads media
+(cut_video, add_watermark and transcribe_video); keep the copies in sync.
+"""
+import contextlib
+import hashlib
+import os
+import shutil
+import threading
+import requests
+
+CACHE_FOLDER = os.environ.get('MEDIA_CACHE_FOLDER', '/tmp/media_cache/')
+MAX_BYTES = int(os.environ.get('MEDIA_CACHE_MAX_BYTES', 1024 * 1024 * 1024))
+PARTIAL_SUFFIX = '.partial'
+
+_lock = threading.Lock()
+_key_locks = {}
+_pinned = {}
+
+
+def get_budget() -> int:
+  """Returns the cache size limit, at most half of the /tmp filesystem."""
+  os.makedirs(CACHE_FOLDER, exist_ok=True)
+  return min(MAX_BYTES, shutil.disk_usage(CACHE_FOLDER).total // 2)
+
+
+def make_key(*parts: str) -> str:
+  """Hashes the identity and version parts of a source into a cache key."""
+  return hashlib.sha256('\n'.join(parts).encode()).hexdigest()
+
+
+def get_path(key: str, suffix: str = '') -> str:
+  return os.path.join(CACHE_FOLDER, key + suffix)
+
+
+def evict(reserve_bytes: int = 0) -> None:
+  """Removes least recently used entries until reserve_bytes would fit.
+
+  Entries that are in use by a request are never removed.
+  """
+  budget = get_budget()
+  with _lock:
+    entries = []
+    for entry in os.scandir(CACHE_FOLDER):
+      if entry.is_file() and not entry.name.endswith(PARTIAL_SUFFIX):
+        stat = entry.stat()
+        entries.append((stat.st_mtime, stat.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+      if total + reserve_bytes <= budget:
+        break
+      if _pinned.get(path):
+        continue
+      os.remove(path)
+      total -= size
+      print(f'Evicted {path} from the media cache.')
+
+
+@contextlib.contextmanager
+def cached(key: str, fill, suffix: str = '', size: int = 0):
+  """Yields the local path of a cache entry, filling it on a miss.
+
+  The entry is pinned while the context is active, so it can be read
+  safely by the caller. It must not be modified or removed.
+
+  Args:
+    key: The cache key from make_key.
+    fill: A function that writes the content to the given path.
+    suffix: The file extension of the entry, e.g. '.mp4'.
+    size: The expected size in bytes, used to make room before the fill.
+
+  Yields:
+    The local path of the cached file.
+  """
+  path = get_path(key, suffix)
+  with _lock:
+    key_lock = _key_locks.setdefault(key, threading.Lock())
+    _pinned[path] = _pinned.get(path, 0) + 1
+  try:
+    with key_lock:
+      if os.path.exists(path):
+        os.utime(path)
+        print(f'Media cache hit for {path}.')
+      else:
+        evict(size)
+        partial_path = path + PARTIAL_SUFFIX
+        try:
+          fill(partial_path)
+          os.replace(partial_path, path)
+        finally:
+          if os.path.exists(partial_path):
+            os.remove(partial_path)
+    yield path
+  finally:
+    with _lock:
+      _pinned[path] -= 1
+      if not _pinned[path]:
+        del _pinned[path]
+    evict()
+
+
+@contextlib.contextmanager
+def cached_blob(blob, suffix: str = '', download=None):
+  """Yields the local path of a GCS blob, downloading it on a miss.
+
+  Args:
+    blob: A google.cloud.storage Blob.
+    suffix: The file extension of the entry, e.g. '.mp4'.
+    download: A function that downloads (blob, path). The blob is downloaded
+      with download_to_filename by default.
+
+  Yields:
+    The local path of the cached file.
+  """
+  blob.reload()
+  key = make_key(
+      f'gs://{blob.bucket.name}/{blob.name}',
+      str(blob.generation),
+      blob.md5_hash or '',
+  )
+  if download is None:
+    fill = blob.download_to_filename
+  else:
+    fill = lambda path: download(blob, path)
+  with cached(key, fill, suffix, blob.size or 0) as path:
+    yield path
+
+
+@contextlib.contextmanager
+def cached_url(url: str, download, suffix: str = ''):
+  """Yields the local path of a URL, downloading it on a miss.
+
+  The ETag (or generation) of the response identifies the content. URLs
+  without a validator are downloaded again on every call.
+
+  Args:
+    url: The URL of the file.
+    download: A function that downloads (url, path).
+    suffix: The file extension of the entry, e.g. '.mp4'.
+
+  Yields:
+    The local path of the cached file.
+  """
+  headers = requests.head(url, allow_redirects=True).headers
+  version = headers.get('x-goog-generation') or headers.get('ETag')
+  base_url = url.split('?', 1)[0]
+  if version is None:
+    key = make_key(base_url, os.urandom(8).hex())
+  else:
+    key = make_key(base_url, version)
+  size = int(headers.get('Content-Length') or 0)
+
+  path = get_path(key, suffix)
+  try:
+    with cached(key, lambda fill_path: download(url, fill_path), suffix, size):
+      yield path
+  finally:
+    if version is None and os.path.exists(path):
+      os.remove(path)
@@ -0,0 +1,155 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the 'License');
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an 'AS IS' BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Firestore backed jobs for asynchronous cut_video requests.
+
+A job is a document in the cut_jobs collection. Its id is a hash of every
+request field that determines the output, so submitting the same segments
+again returns the running or finished job instead of starting a duplicate
+render. The render reports its progress to the job document, which the
+frontend subscribes to.
+
+Every write to the job document refreshes its updatedAt timestamp, which
+serves as the lease of the job. A job that is still queued or running once
+its lease has expired was killed, e.g. by the function timeout or an out of
+memory error, and is recreated by the next identical request.
+"""
+import datetime
+import hashlib
+import json
+import time
+from firebase_admin import firestore
+from google.api_core import exceptions
+
+JOBS_COLLECTION = 'cut_jobs'
+STATUS_QUEUED = 'queued'
+STATUS_RUNNING = 'running'
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+# Request fields besides the segments that determine the output of a cut.
+JOB_KEY_FIELDS = (
+    'fileName', 'fullPath', 'engine', 'aspectRatios', 'watermarkMode'
+)
+PROGRESS_INTERVAL_SECONDS = 2
+# Longer than the 540 second timeout of process_cut_job, so a job whose last
+# update is older than this cannot be running anymore.
+JOB_LEASE_SECONDS = 600
+
+
+def get_job_request(data: dict) -> dict:
+  """Returns the request to store with the job.
+
+  Only the timestamps of the segments are kept, the words of each line are
+  not needed to cut the video and would bloat the document.
+  """
+  job_request = {key: value for key, value in data.items()
+                 if key not in ('transcript', 'async')}
+  job_request['transcript'] = [
+      {'startTime': line['startTime'], 'endTime': line['endTime']}
+      for line in data['transcript']
+  ]
+  return job_request
+
+
+def make_job_key(data: dict) -> str:
+  """Hashes the segments and the output options of a request."""
+  job_request = get_job_request(data)
+  key = {field: job_request.get(field) for field in JOB_KEY_FIELDS}
+  key['transcript'] = job_request['transcript']
+  return hashlib.sha256(
+      json.dumps(key, sort_keys=True).encode()
+  ).hexdigest()
+
+
+def is_expired(job: dict) -> bool:
+  """Returns whether a queued or running job has outlived its lease."""
+  if job.get('status') not in (STATUS_QUEUED, STATUS_RUNNING):
+    return False
+  updated_at = job.get('updatedAt') or job.get('createdAt')
+  if updated_at is None:
+    return True
+  age = datetime.datetime.now(datetime.timezone.utc) - updated_at
+  return age.total_seconds() > JOB_LEASE_SECONDS
+
+
+def submit_job(data: dict) -> dict:
+  """Creates the job of a request unless an identical job already exists.
+
+  A failed job, or a job whose lease has expired, is recreated, which
+  triggers a new render.
+
+  Args:
+    data: The data of the cut_video request.
+
+  Returns:
+    The jobId and the current status of the job.
+  """
+  db = firestore.client()
+  job_id = make_job_key(data)
+  doc_ref = db.collection(JOBS_COLLECTION).document(job_id)
+  job = {
+      'request': get_job_request(data),
+      'status': STATUS_QUEUED,
+      'progress': {},
+      'createdAt': firestore.SERVER_TIMESTAMP,
+      'updatedAt': firestore.SERVER_TIMESTAMP,
+  }
+  try:
+    doc_ref.create(job)
+    return {'jobId': job_id, 'status': STATUS_QUEUED}
+  except exceptions.AlreadyExists:
+    existing_job = doc_ref.get().to_dict() or {}
+
+  if existing_job.get('status') == STATUS_FAILED or is_expired(existing_job):
+    print(f'Recreating job {job_id} with status {existing_job.get("status")}')
+    doc_ref.delete()
+    try:
+      doc_ref.create(job)
+    except exceptions.AlreadyExists:
+      # A concurrent identical request recreated the job first.
+      pass
+    return {'jobId': job_id, 'status': STATUS_QUEUED}
+  print(f'Reusing job {job_id} with status {existing_job.get("status")}')
+  return {'jobId': job_id, 'status': existing_job.get('status')}
+
+
+class JobProgress:
+  """Reports the progress of a job to its Firestore document.
+
+  Calling the instance with a stage ('download', 'encode' or 'upload') and
+  the completed fraction of that stage records the progress. Writes are
+  throttled to one every PROGRESS_INTERVAL_SECONDS, except when a stage
+  completes. Every write also renews the lease of the job.
+  """
+
+  def __init__(self, job_id: str):
+    self._doc_ref = firestore.client().collection(
+        JOBS_COLLECTION).document(job_id)
+    self._last_write = 0
+
+  def __call__(self, stage: str, fraction: float) -> None:
+    now = time.monotonic()
+    if fraction < 1 and now - self._last_write < PROGRESS_INTERVAL_SECONDS:
+      return
+    self._last_write = now
+    self._doc_ref.update({
+        f'progress.{stage}': round(min(fraction, 1), 3),
+        'updatedAt': firestore.SERVER_TIMESTAMP,
+    })
+
+  def set_status(self, status: str, **fields) -> None:
+    self._doc_ref.update({
+        'status': status,
+        'updatedAt': firestore.SERVER_TIMESTAMP,
+        **fields,
+    })
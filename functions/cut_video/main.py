@@ -11,16 +11,20 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
-from firebase_functions import https_fn, options
+from firebase_functions import firestore_fn, https_fn, options
 from firebase_admin import initialize_app
 import requests
 import google.auth.transport.requests
 import google.oauth2.id_token
-import moviepy.editor as mpy
 from moviepy.editor import VideoFileClip
-from moviepy.video.fx.all import crop
 from google.cloud import storage
 import os
+import subprocess
+import jobs
+import media_cache
+import render
+import stream_copy
+from timeline import build_timeline
 
 initialize_app()
 
@@ -29,6 +33,19 @@ OUTPUT_FOLDER = 'output/'
 WATERMARK_API_URI = 'https://asia-southeast1-adclip.cloudfunctions.net'
 + '/watermark_gen1'
 STORAGE_BUCKET = os.environ.get('BUCKET', 'Storage bucket is not set.')
+ENGINE_STREAM_COPY = 'stream_copy'
+ENGINE_MOVIEPY = 'moviepy'
+CUT_ENGINE = os.environ.get('CUT_ENGINE', ENGINE_STREAM_COPY)
+DOWNLOAD_FULL = 'full'
+DOWNLOAD_RANGED = 'ranged'
+DOWNLOAD_MODE = os.environ.get('DOWNLOAD_MODE', DOWNLOAD_FULL)
+DOWNLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+WATERMARK_REMOTE = 'remote'
+WATERMARK_INLINE = 'inline'
+WATERMARK_MODE = os.environ.get('WATERMARK_MODE', WATERMARK_REMOTE)
+WATERMARK_FOLDER = 'https://storage.googleapis.com/adclip.appspot.com/watermark'
+ADCLIP_WATERMARK_URI = f'{WATERMARK_FOLDER}/adclip.png'
+ADCLIP_WATERMARK_URI_SMALL = f'{WATERMARK_FOLDER}/adclip_small.png'
 storage_client = storage.Client()
 
 
@@ -55,6 +72,19 @@ def add_watermark(
     print('An exception occurred')
 
 
+def get_watermark_urls(output_names: list) -> dict:
+  """Assigns a watermark image to each output format.
+
+  The landscape output gets the full size watermark, the cropped formats get
+  the small one, the same as the watermark service.
+  """
+  return {
+    name: (ADCLIP_WATERMARK_URI if name == 'landscape'
+           else ADCLIP_WATERMARK_URI_SMALL)
+    for name in output_names
+  }
+
+
 def upload_blob(source_file_name: str, destination_blob_name: str) -> None:
   bucket = storage_client.get_bucket(STORAGE_BUCKET)
   blob = bucket.blob(destination_blob_name)
@@ -63,6 +93,75 @@ def upload_blob(source_file_name: str, destination_blob_name: str) -> None:
   os.remove(source_file_name)
 
 
+def download_video(
+    video_url: str,
+    file_path: str,
+    progress=render.report_nothing
+) -> None:
+  """Streams the video to file_path without holding it in memory."""
+  with requests.get(video_url, stream=True) as r:
+    r.raise_for_status()
+    total_bytes = int(r.headers.get('Content-Length') or 0)
+    downloaded_bytes = 0
+    with open(file_path, 'wb') as file:
+      for chunk in r.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+        file.write(chunk)
+        downloaded_bytes += len(chunk)
+        if total_bytes:
+          progress('download', downloaded_bytes / total_bytes)
+  progress('download', 1)
+  print(f'File {video_url} downloaded to {file_path}.')
+
+
+def download_blob(
+    blob: storage.Blob,
+    file_path: str,
+    progress=render.report_nothing
+) -> None:
+  """Streams the blob to file_path and reports the downloaded fraction."""
+  total_bytes = blob.size or 0
+  downloaded_bytes = 0
+  with blob.open('rb', chunk_size=DOWNLOAD_CHUNK_SIZE) as reader, \
+      open(file_path, 'wb') as file:
+    while chunk := reader.read(DOWNLOAD_CHUNK_SIZE):
+      file.write(chunk)
+      downloaded_bytes += len(chunk)
+      if total_bytes:
+        progress('download', downloaded_bytes / total_bytes)
+  progress('download', 1)
+  print(f'File {blob.name} downloaded to {file_path}.')
+
+
+def is_remote(video_path: str) -> bool:
+  return video_path.startswith(('http://', 'https://'))
+
+
+def cached_source(
+    video_url: str,
+    file_name: str,
+    full_path: str = None,
+    progress=render.report_nothing
+):
+  """Returns a context manager with the local path of the source video.
+
+  The source is looked up in the media cache by its GCS generation when the
+  storage path is known, and by the ETag of the download URL otherwise.
+  """
+  suffix = os.path.splitext(file_name)[1]
+  if full_path:
+    bucket = storage_client.get_bucket(STORAGE_BUCKET)
+    return media_cache.cached_blob(
+      bucket.blob(full_path),
+      suffix,
+      lambda blob, path: download_blob(blob, path, progress)
+    )
+  return media_cache.cached_url(
+    video_url,
+    lambda url, path: download_video(url, path, progress),
+    suffix
+  )
+
+
 def merge_overlapping_clips(clips: list) -> list:
   """Merges overlapping clips
 
@@ -90,48 +189,109 @@ def merge_overlapping_clips(clips: list) -> list:
   return output
 
 
-def clip_video(video_path: str, file_name: str, segments: list) -> any:
+def clip_video_moviepy(
+    video_path: str,
+    file_name: str,
+    segments: list,
+    output_names: list,
+    watermarks: dict | None = None,
+    progress=render.report_nothing
+) -> any:
   original_clip = VideoFileClip(video_path)
-  new_clip = None
+  new_clip = build_timeline(original_clip, segments)
 
-  segments = merge_overlapping_clips(segments)
+  output_paths = {
+    name: render.get_output_path(TMP_FOLDER, name, file_name)
+    for name in output_names
+  }
+  render.render_outputs(new_clip, output_paths, watermarks, progress)
+
+  return output_paths
 
-  for segment in segments:
-    sub_clip = original_clip.subclip(segment['startTime'], segment['endTime'])
-    new_clip = sub_clip if new_clip is None else mpy.concatenate_videoclips(
-      [new_clip, sub_clip]
-    )
 
-  (w, h) = new_clip.size
-  crop_width = h * 9 / 16
-  crop_width = crop_width // 2 * 2
+def clip_video(
+    video_path: str,
+    file_name: str,
+    segments: list,
+    engine: str = CUT_ENGINE,
+    output_names: list = render.DEFAULT_OUTPUTS,
+    watermarks: dict | None = None,
+    progress=render.report_nothing
+) -> any:
+  """Cuts the segments from the video with the selected engine.
 
-  x1, x2 = (w - crop_width) // 2, (w + crop_width) // 2
-  y1, y2 = 0, h
-  cropped_clip = crop(new_clip, x1=x1, y1=y1, x2=x2, y2=y2)
+  The stream copy engine falls back to MoviePy when the source cannot be cut
+  without a full re-encode, e.g. for an unsupported codec.
 
-  video_output_path = f'{TMP_FOLDER}output_{file_name}.mp4'
-  video_output_path_original = f'{TMP_FOLDER}output_original_{file_name}.mp4'
+  The stream copy engine can also read the source from a URL, in which case
+  ffmpeg only fetches the container index and the byte ranges of the
+  segments. A remote source is downloaded in full before falling back.
 
-  cropped_clip.write_videofile(video_output_path, audio_codec='aac')
-  new_clip.write_videofile(video_output_path_original, audio_codec='aac')
+  Args:
+      video_path: A local path or a URL of the source video.
+      file_name: A file name for temp use.
+      segments: The list of transcript dict with startTime and endTime.
+      engine: Either ENGINE_STREAM_COPY or ENGINE_MOVIEPY.
+      output_names: The output formats from render.OUTPUT_ASPECT_RATIOS.
+      watermarks: The watermark image URL by output format name. The
+        watermarked renditions are written from the same decode to
+        render.get_watermarked_path of each output.
+      progress: A callback that receives the stage and its completed fraction.
 
-  return {
-    'video_output_path': video_output_path,
-    'video_output_path_original': video_output_path_original
-  }
+  Returns:
+      The local path of each output by output format name.
+  """
+  segments = merge_overlapping_clips(segments)
+
+  if engine == ENGINE_STREAM_COPY:
+    try:
+      return stream_copy.clip_video(
+        video_path,
+        file_name,
+        segments,
+        TMP_FOLDER,
+        output_names,
+        watermarks,
+        progress
+      )
+    except (stream_copy.StreamCopyError,
+            subprocess.CalledProcessError,
+            OSError) as e:
+      print(f'Stream copy failed, falling back to MoviePy: {e}')
+
+  if is_remote(video_path):
+    with cached_source(
+        video_path, file_name, progress=progress) as file_path:
+      return clip_video_moviepy(
+        file_path, file_name, segments, output_names, watermarks, progress
+      )
+
+  return clip_video_moviepy(
+    video_path, file_name, segments, output_names, watermarks, progress
+  )
 
 
 def upload_clips(
     file_name: str,
-    video_output_path: str,
-    video_output_path_original: str
+    output_paths: dict,
+    progress=render.report_nothing
 ) -> None:
-    upload_blob(video_output_path, f'{OUTPUT_FOLDER}vertical_tmp_{file_name}')
-    upload_blob(
-      video_output_path_original,
-      f'{OUTPUT_FOLDER}landscape_tmp_{file_name}'
-    )
+    """Uploads the outputs and requests the watermarked renditions.
+
+    The watermark service only handles the vertical and the landscape output,
+    any additional format is uploaded as final output directly.
+    """
+    paths_to_upload = [
+      (output_paths['vertical'], f'{OUTPUT_FOLDER}vertical_tmp_{file_name}'),
+      (output_paths['landscape'], f'{OUTPUT_FOLDER}landscape_tmp_{file_name}')
+    ]
+    for name, path in output_paths.items():
+      if name not in render.DEFAULT_OUTPUTS:
+        paths_to_upload.append((path, f'{OUTPUT_FOLDER}{name}_{file_name}'))
+
+    for index, (path, destination) in enumerate(paths_to_upload):
+      upload_blob(path, destination)
+      progress('upload', (index + 1) / len(paths_to_upload))
 
     add_watermark(
       WATERMARK_API_URI,
@@ -141,10 +301,102 @@ def upload_clips(
   )
 
 
+def upload_clips_with_watermark(
+    file_name: str,
+    output_paths: dict,
+    progress=render.report_nothing
+) -> None:
+  """Uploads the outputs rendered with their watermarked renditions."""
+  for index, (name, path) in enumerate(output_paths.items()):
+    upload_blob(
+      render.get_watermarked_path(path),
+      f'{OUTPUT_FOLDER}{name}_{file_name}'
+    )
+    upload_blob(path, f'{OUTPUT_FOLDER}nowm_{name}_{file_name}')
+    progress('upload', (index + 1) / len(output_paths))
+
+
+def run_cut(
+    data: dict,
+    progress=render.report_nothing,
+    job_id: str | None = None
+) -> dict:
+  """Cuts, renders and uploads the output videos of a cut_video request.
+
+  Args:
+      data: The data of the cut_video request.
+      progress: A callback that receives the stage and its completed fraction.
+      job_id: The id of the job of an asynchronous request. It prefixes the
+        temp and output file names, so jobs of the same source never
+        overwrite each other's outputs.
+
+  Returns:
+      The storage paths of the output videos.
+  """
+  summarized_transcript = data['transcript']
+  video_url = data['videoUrl']
+  source_name = data['fileName']
+  file_name = f'{job_id}_{source_name}' if job_id else source_name
+  engine = data.get('engine') or CUT_ENGINE
+  output_names = render.get_output_names(data.get('aspectRatios'))
+
+  download_mode = data.get('downloadMode') or DOWNLOAD_MODE
+  full_path = data.get('fullPath')
+  watermark_mode = data.get('watermarkMode') or WATERMARK_MODE
+
+  watermarks = None
+  if watermark_mode == WATERMARK_INLINE:
+    watermarks = get_watermark_urls(output_names)
+
+  if download_mode == DOWNLOAD_RANGED and engine == ENGINE_STREAM_COPY:
+    output_paths = clip_video(
+      video_url,
+      file_name,
+      summarized_transcript,
+      engine,
+      output_names,
+      watermarks,
+      progress
+    )
+  else:
+    with cached_source(
+        video_url, source_name, full_path, progress) as video_path:
+      progress('download', 1)
+      output_paths = clip_video(
+        video_path,
+        file_name,
+        summarized_transcript,
+        engine,
+        output_names,
+        watermarks,
+        progress
+      )
+
+  if watermark_mode == WATERMARK_INLINE:
+    upload_clips_with_watermark(file_name, output_paths, progress)
+  else:
+    upload_clips(file_name, output_paths, progress)
+
+  output_urls = {
+    'full_path_vertical': f'{OUTPUT_FOLDER}landscape_{file_name}',
+    'full_path': f'{OUTPUT_FOLDER}vertical_{file_name}',
+  }
+  for name in output_names:
+    if name not in render.DEFAULT_OUTPUTS:
+      output_urls[f'full_path_{name}'] = f'{OUTPUT_FOLDER}{name}_{file_name}'
+
+  return output_urls
+
+
 @https_fn.on_call(timeout_sec=600, memory=options.MemoryOption.GB_4, cpu=2,
   region='asia-southeast1')
 def cut_video(request: https_fn.CallableRequest) -> any:
   """HTTP Cloud Function.
+
+  With 'async' set in the request data, the render runs in process_cut_job
+  and the function returns the jobId of the cut_jobs document at once. The
+  document reports the progress and holds the output paths when done.
+
   Args:
       request (flask.Request): The request object.
       <https://flask.palletsprojects.com/en/1.1.x/api/#incoming-request-data>
@@ -153,25 +405,28 @@ def cut_video(request: https_fn.CallableRequest) -> any:
       Response object using `make_response`
       <https://flask.palletsprojects.com/en/1.1.x/api/#flask.make_response>.
   """
-  summarized_transcript = request.data['transcript']
-  video_url = request.data['videoUrl']
-  file_name = request.data['fileName']
-
-  r = requests.get(video_url)
-  file_path = f'{TMP_FOLDER}{file_name}'
-  with open(file_path, 'wb') as file:
-    file.write(r.content)
-
-  output_paths = clip_video(file_path, file_name, summarized_transcript)
-  upload_clips(
-    file_name,
-    output_paths['video_output_path'],
-    output_paths['video_output_path_original']
-  )
-
-  output_urls = {
-    'full_path_vertical': f'{OUTPUT_FOLDER}landscape_{file_name}',
-    'full_path': f'{OUTPUT_FOLDER}vertical_{file_name}',
-  }
-
-  return output_urls
+  if request.data.get('async'):
+    return jobs.submit_job(request.data)
+  return run_cut(request.data)
+
+
+@firestore_fn.on_document_created(
+  document=f'{jobs.JOBS_COLLECTION}/{{jobId}}',
+  timeout_sec=540,
+  memory=options.MemoryOption.GB_4,
+  cpu=2,
+  region='asia-southeast1'
+)
+def process_cut_job(event: firestore_fn.Event) -> None:
+  """Renders a job submitted by cut_video and records the outcome."""
+  job_id = event.params['jobId']
+  job = event.data.to_dict()
+  progress = jobs.JobProgress(job_id)
+  progress.set_status(jobs.STATUS_RUNNING)
+  try:
+    output_urls = run_cut(job['request'], progress, job_id)
+  except Exception as e:
+    print(f'Job {job_id} failed: {e}')
+    progress.set_status(jobs.STATUS_FAILED, error=str(e))
+    raise
+  progress.set_status(jobs.STATUS_DONE, result=output_urls)
@@ -0,0 +1,174 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the 'License');
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an 'AS IS' BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Renders every output format of a cut from a single decode of the frames."""
+import os
+import imageio
+import moviepy.editor as mpy
+import numpy as np
+import watermark_assets
+from moviepy.video.io.ffmpeg_writer import FFMPEG_VideoWriter
+
+# Output formats by name with their (width, height) aspect ratio. None keeps
+# the aspect ratio of the source. Adding a format here does not add a decode.
+OUTPUT_ASPECT_RATIOS = {
+    'landscape': None,
+    'vertical': (9, 16),
+    'square': (1, 1),
+    'portrait': (4, 5),
+}
+# Formats that are always rendered, the watermark service expects both.
+DEFAULT_OUTPUTS = ('vertical', 'landscape')
+AUDIO_FPS = 44100
+# Top left corner of the watermark, matching overlay=10:10 in add_watermark.
+WATERMARK_POSITION = (10, 10)
+
+
+def report_nothing(stage: str, fraction: float) -> None:
+  """Default progress callback, for cuts that nobody follows."""
+
+
+def get_output_names(requested: list | None) -> list:
+  """Returns the default outputs followed by the known requested extras."""
+  names = list(DEFAULT_OUTPUTS)
+  for name in requested or []:
+    if name in OUTPUT_ASPECT_RATIOS and name not in names:
+      names.append(name)
+  return names
+
+
+def get_output_path(tmp_folder: str, name: str, file_name: str) -> str:
+  """Returns the local path of an output format."""
+  if name == 'landscape':
+    return f'{tmp_folder}output_original_{file_name}.mp4'
+  if name == 'vertical':
+    return f'{tmp_folder}output_{file_name}.mp4'
+  return f'{tmp_folder}output_{name}_{file_name}.mp4'
+
+
+def get_watermarked_path(output_path: str) -> str:
+  """Returns the local path of the watermarked rendition of an output."""
+  return f'{os.path.splitext(output_path)[0]}_wm.mp4'
+
+
+def load_watermark(watermark_path: str) -> tuple:
+  """Loads a watermark image as float RGB and alpha arrays for blending."""
+  image = np.asarray(imageio.imread(watermark_path), dtype=np.float32)
+  if image.ndim == 2:
+    image = np.dstack([image] * 3)
+  if image.shape[2] == 4:
+    return image[:, :, :3], image[:, :, 3:] / 255
+  return image[:, :, :3], np.ones(image.shape[:2] + (1,), dtype=np.float32)
+
+
+def overlay_watermark(frame: np.ndarray, watermark: tuple) -> np.ndarray:
+  """Blends the watermark onto a copy of the frame at WATERMARK_POSITION."""
+  rgb, alpha = watermark
+  x, y = WATERMARK_POSITION
+  height = max(min(rgb.shape[0], frame.shape[0] - y), 0)
+  width = max(min(rgb.shape[1], frame.shape[1] - x), 0)
+  output = frame.copy()
+  region = output[y:y + height, x:x + width].astype(np.float32)
+  region_alpha = alpha[:height, :width]
+  output[y:y + height, x:x + width] = (
+      region * (1 - region_alpha) + rgb[:height, :width] * region_alpha
+  ).astype(np.uint8)
+  return output
+
+
+def crop_box(width: int, height: int, aspect_ratio: tuple | None) -> tuple:
+  """Computes the centered crop of a frame for the given aspect ratio.
+
+  Args:
+      width: The width of the source frame.
+      height: The height of the source frame.
+      aspect_ratio: A (width, height) ratio, or None to keep the frame.
+
+  Returns:
+      The crop box as (x1, y1, x2, y2) with even width and height.
+  """
+  if aspect_ratio is None:
+    return (0, 0, width, height)
+  ratio_width, ratio_height = aspect_ratio
+  if ratio_width / ratio_height <= width / height:
+    crop_width = height * ratio_width / ratio_height // 2 * 2
+    x1, x2 = (width - crop_width) // 2, (width + crop_width) // 2
+    return (int(x1), 0, int(x2), height)
+  crop_height = width * ratio_height / ratio_width // 2 * 2
+  y1, y2 = (height - crop_height) // 2, (height + crop_height) // 2
+  return (0, int(y1), width, int(y2))
+
+
+def render_outputs(
+    clip: mpy.VideoClip,
+    output_paths: dict,
+    watermarks: dict | None = None,
+    progress=report_nothing) -> None:
+  """Writes all output formats while decoding each frame only once.
+
+  The audio track is encoded once and muxed into every output. Each decoded
+  frame is cropped for every format and sent to that format's encoder, and
+  to the encoder of its watermarked rendition if one is requested.
+
+  Args:
+      clip: The clip of the output video.
+      output_paths: The local path to write to by output format name.
+      watermarks: The watermark image URL by output format name. The
+        watermarked renditions are written to get_watermarked_path.
+      progress: A callback that receives the stage and its completed fraction.
+  """
+  watermarks = watermarks or {}
+  audio_path = None
+  if clip.audio is not None:
+    audio_path = f'{os.path.splitext(output_paths["landscape"])[0]}_audio.m4a'
+    clip.audio.write_audiofile(
+        audio_path, fps=AUDIO_FPS, codec='aac', logger=None
+    )
+
+  (w, h) = clip.size
+  writers = []
+  try:
+    for name, path in output_paths.items():
+      box = crop_box(w, h, OUTPUT_ASPECT_RATIOS[name])
+      (x1, y1, x2, y2) = box
+      size = (x2 - x1, y2 - y1)
+      writers.append((
+          FFMPEG_VideoWriter(path, size, clip.fps, audiofile=audio_path),
+          box,
+          None
+      ))
+      if name in watermarks:
+        writers.append((
+            FFMPEG_VideoWriter(
+                get_watermarked_path(path), size, clip.fps, audiofile=audio_path
+            ),
+            box,
+            load_watermark(
+                watermark_assets.get_watermark(watermarks[name], size[0])
+            )
+        ))
+
+    total_frames = max(int(clip.duration * clip.fps), 1)
+    for index, frame in enumerate(clip.iter_frames(dtype='uint8', logger=None)):
+      progress('encode', min(index / total_frames, 0.999))
+      for writer, (x1, y1, x2, y2), watermark in writers:
+        cropped_frame = frame[y1:y2, x1:x2]
+        if watermark is not None:
+          cropped_frame = overlay_watermark(cropped_frame, watermark)
+        writer.write_frame(cropped_frame)
+    progress('encode', 1)
+  finally:
+    for writer, _, _ in writers:
+      writer.close()
+    if audio_path is not None and os.path.exists(audio_path):
+      os.remove(audio_path)
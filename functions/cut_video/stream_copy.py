@@ -0,0 +1,375 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the 'License');
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an 'AS IS' BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Keyframe-aware cutting engine built on ffmpeg stream copy.
+
+Each segment is split into pieces: the part from the first keyframe inside
+the segment to its end is stream copied without decoding, and only the short
+GOP fragment between the start of the segment and that keyframe is
+re-encoded. A start within KEYFRAME_TOLERANCE of a keyframe snaps to it so
+that no fragment needs to be encoded at all. A copy may end on any frame, so
+the end of a segment is never re-encoded.
+
+The re-encoded fragments use the profile, level and pixel format of the
+source, and the pieces are written as MPEG-TS so that every piece carries
+its own SPS and PPS in-band. Sources whose codecs cannot be matched raise
+StreamCopyError, and the caller falls back to the re-encode engine. The
+pieces are joined with the ffmpeg concat demuxer.
+"""
+import bisect
+import json
+import os
+import subprocess
+from render import crop_box
+from render import get_output_path
+from render import get_watermarked_path
+from render import OUTPUT_ASPECT_RATIOS
+from render import report_nothing
+from render import WATERMARK_POSITION
+import watermark_assets
+
+FFMPEG_BINARY = os.environ.get('FFMPEG_BINARY', 'ffmpeg')
+FFPROBE_BINARY = os.environ.get('FFPROBE_BINARY', 'ffprobe')
+KEYFRAME_TOLERANCE = 0.1
+# Re-encoded fragments must be bitstream compatible with the copied ones.
+COPYABLE_VIDEO_CODECS = {'h264': 'libx264'}
+# The x264 profile for each H.264 profile name reported by ffprobe.
+X264_PROFILES = {
+    'Constrained Baseline': 'baseline',
+    'Baseline': 'baseline',
+    'Main': 'main',
+    'High': 'high',
+}
+# The encoder for each audio codec and the profiles it writes.
+COPYABLE_AUDIO_CODECS = {'aac': ('aac', {'LC'})}
+PIECE_FORMAT = 'mpegts'
+
+
+class StreamCopyError(Exception):
+  """Raised when the source video cannot be cut with stream copy."""
+
+
+def run_ffmpeg(args: list) -> None:
+  """Runs ffmpeg with the given arguments and fails on a non-zero exit."""
+  subprocess.run(
+      [FFMPEG_BINARY, '-hide_banner', '-loglevel', 'error', '-y', *args],
+      check=True,
+  )
+
+
+def probe_streams(video_path: str) -> dict:
+  """Returns the first video and audio stream of the file as probed by ffprobe.
+
+  Args:
+    video_path: A local path or a URL of the video.
+
+  Returns:
+    A dict with the 'video' stream and the 'audio' stream (or None).
+  """
+  output = subprocess.run(
+      [
+          FFPROBE_BINARY, '-v', 'error',
+          '-show_entries',
+          'stream=codec_type,codec_name,profile,level,width,height,pix_fmt,'
+          'sample_rate,channels',
+          '-of', 'json',
+          video_path,
+      ],
+      check=True,
+      capture_output=True,
+      text=True,
+  ).stdout
+  streams = json.loads(output).get('streams', [])
+  video = next((s for s in streams if s['codec_type'] == 'video'), None)
+  audio = next((s for s in streams if s['codec_type'] == 'audio'), None)
+  if video is None:
+    raise StreamCopyError(f'No video stream found in {video_path}')
+  return {'video': video, 'audio': audio}
+
+
+def get_keyframes(video_path: str, segments: list | None = None) -> list:
+  """Lists the keyframe timestamps of the first video stream.
+
+  Only the packet headers are read, no frame is decoded. When segments are
+  given, ffprobe seeks to each segment and reads only its packets, so a
+  remote source is fetched with range requests for those parts only.
+
+  Args:
+    video_path: A local path or a URL of the video.
+    segments: The list of segments with startTime and endTime to probe.
+
+  Returns:
+    A sorted list of keyframe timestamps in seconds.
+  """
+  read_intervals = []
+  if segments:
+    read_intervals = ['-read_intervals', ','.join(
+        f"{max(segment['startTime'] - KEYFRAME_TOLERANCE, 0):.6f}"
+        f"%{segment['endTime'] + KEYFRAME_TOLERANCE:.6f}"
+        for segment in segments
+    )]
+  output = subprocess.run(
+      [
+          FFPROBE_BINARY, '-v', 'error',
+          '-select_streams', 'v:0',
+          *read_intervals,
+          '-show_entries', 'packet=pts_time,flags',
+          '-of', 'csv=p=0',
+          video_path,
+      ],
+      check=True,
+      capture_output=True,
+      text=True,
+  ).stdout
+
+  keyframes = []
+  for line in output.splitlines():
+    pts_time, _, flags = line.partition(',')
+    if 'K' in flags and pts_time not in ('', 'N/A'):
+      keyframes.append(float(pts_time))
+  return sorted(set(keyframes))
+
+
+def plan_segment(
+    start_time: float,
+    end_time: float,
+    keyframes: list,
+    tolerance: float = KEYFRAME_TOLERANCE) -> list:
+  """Splits a segment into pieces that are stream copied or re-encoded.
+
+  Args:
+    start_time: The start of the segment in seconds.
+    end_time: The end of the segment in seconds.
+    keyframes: The sorted keyframe timestamps of the source.
+    tolerance: How far a boundary may move to snap onto a keyframe.
+
+  Returns:
+    A list of (start_time, end_time, should_copy) tuples covering the segment.
+    For example, [(1.3, 2.0, False), (2.0, 8.4, True)]
+  """
+  first = bisect.bisect_left(keyframes, start_time - tolerance)
+  if first >= len(keyframes) or keyframes[first] >= end_time:
+    return [(start_time, end_time, False)]
+
+  copy_start = keyframes[first]
+  if copy_start - start_time <= tolerance:
+    return [(copy_start, end_time, True)]
+  return [(start_time, copy_start, False), (copy_start, end_time, True)]
+
+
+def check_streams(streams: dict) -> None:
+  """Fails unless re-encoded fragments can match the source streams.
+
+  Raises:
+    StreamCopyError: When the video or the audio codec, or their profile,
+      cannot be written by the fragment encoders.
+  """
+  video = streams['video']
+  if video['codec_name'] not in COPYABLE_VIDEO_CODECS:
+    raise StreamCopyError(
+        f"Unsupported codec {video['codec_name']} for stream copy"
+    )
+  if video.get('profile') not in X264_PROFILES:
+    raise StreamCopyError(
+        f"Unsupported profile {video.get('profile')} for stream copy"
+    )
+  audio = streams['audio']
+  if audio is None:
+    return
+  if audio['codec_name'] not in COPYABLE_AUDIO_CODECS:
+    raise StreamCopyError(
+        f"Unsupported audio codec {audio['codec_name']} for stream copy"
+    )
+  _, profiles = COPYABLE_AUDIO_CODECS[audio['codec_name']]
+  if audio.get('profile') not in profiles:
+    raise StreamCopyError(
+        f"Unsupported audio profile {audio.get('profile')} for stream copy"
+    )
+
+
+def _encode_args(streams: dict) -> list:
+  """Builds encoder arguments that match the source streams for concat."""
+  video = streams['video']
+  args = [
+      '-c:v', COPYABLE_VIDEO_CODECS[video['codec_name']],
+      '-preset', 'veryfast',
+      '-profile:v', X264_PROFILES[video['profile']],
+      '-pix_fmt', video['pix_fmt'],
+  ]
+  if video.get('level', 0) > 0:
+    args += ['-level:v', f"{video['level'] / 10:.1f}"]
+  audio = streams['audio']
+  if audio is not None:
+    encoder, _ = COPYABLE_AUDIO_CODECS[audio['codec_name']]
+    args += [
+        '-c:a', encoder,
+        '-ar', str(audio['sample_rate']),
+        '-ac', str(audio['channels']),
+    ]
+  return args
+
+
+def cut_piece(
+    video_path: str,
+    output_path: str,
+    piece: tuple,
+    streams: dict) -> None:
+  """Writes a single planned piece of the source to output_path.
+
+  The piece is written as MPEG-TS, so the copied pieces get their parameter
+  sets in-band before every keyframe and the re-encoded ones keep their own.
+  """
+  start_time, end_time, should_copy = piece
+  args = [
+      '-ss', f'{start_time:.6f}',
+      '-i', video_path,
+      '-t', f'{end_time - start_time:.6f}',
+      '-map', '0:v:0',
+  ]
+  if streams['audio'] is not None:
+    args += ['-map', '0:a:0']
+  if should_copy:
+    args += ['-c', 'copy', '-avoid_negative_ts', 'make_zero']
+  else:
+    args += _encode_args(streams)
+  run_ffmpeg([*args, '-f', PIECE_FORMAT, output_path])
+
+
+def concat_pieces(
+    piece_paths: list, output_path: str, has_audio: bool) -> None:
+  """Joins the pieces into one file with the concat demuxer."""
+  list_path = f'{output_path}.txt'
+  with open(list_path, 'w') as file:
+    for path in piece_paths:
+      escaped_path = path.replace("'", "'\\''")
+      file.write(f"file '{escaped_path}'\n")
+  # The ADTS headers of the MPEG-TS audio are moved to the MP4 sample entry.
+  audio_args = ['-bsf:a', 'aac_adtstoasc'] if has_audio else []
+  try:
+    run_ffmpeg([
+        '-f', 'concat', '-safe', '0', '-i', list_path,
+        '-c', 'copy', *audio_args, '-movflags', '+faststart', output_path,
+    ])
+  finally:
+    os.remove(list_path)
+
+
+def crop_outputs(
+    video_path: str, outputs: list, width: int, height: int) -> None:
+  """Encodes the cropped output formats from one decode of the video.
+
+  Args:
+    video_path: A local path of the cut in the source aspect ratio.
+    outputs: A list of (name, output_path, watermark_url) to encode. The
+      watermark is overlaid when watermark_url is not None.
+    width: The width of the video.
+    height: The height of the video.
+  """
+  if not outputs:
+    return
+  inputs = ['-i', video_path]
+  labels = [f'[v{index}]' for index in range(len(outputs))]
+  filters = [f"[0:v]split={len(outputs)}{''.join(labels)}"]
+  output_args = []
+  for index, (name, path, watermark_url) in enumerate(outputs):
+    (x1, y1, x2, y2) = crop_box(width, height, OUTPUT_ASPECT_RATIOS[name])
+    crop = f'{labels[index]}crop={x2 - x1}:{y2 - y1}:{x1}:{y1}'
+    if watermark_url is None:
+      filters.append(f'{crop}[o{index}]')
+    else:
+      # Each overlay reads its own image input, a stream is consumed once.
+      watermark_path = watermark_assets.get_watermark(watermark_url, x2 - x1)
+      inputs += ['-i', watermark_path]
+      watermark_input = len(inputs) // 2 - 1
+      (x, y) = WATERMARK_POSITION
+      filters.append(f'{crop}[c{index}]')
+      filters.append(
+          f'[c{index}][{watermark_input}:v]overlay={x}:{y}[o{index}]'
+      )
+    output_args += ['-map', f'[o{index}]', '-map', '0:a?', '-c:a', 'copy', path]
+  run_ffmpeg([*inputs, '-filter_complex', ';'.join(filters), *output_args])
+
+
+def clip_video(
+    video_path: str,
+    file_name: str,
+    segments: list,
+    tmp_folder: str,
+    output_names: list,
+    watermarks: dict | None = None,
+    progress=report_nothing) -> dict:
+  """Cuts the segments from the video with stream copy where possible.
+
+  The landscape output is the stream copied cut itself, the other formats
+  and all watermarked renditions are encoded from it in a single ffmpeg
+  pass.
+
+  Args:
+    video_path: A local path or a URL of the source video.
+    file_name: A file name for temp use.
+    segments: The merged list of segments with startTime and endTime.
+    tmp_folder: The folder to write the pieces and outputs to.
+    output_names: The output formats to render, including 'landscape'.
+    watermarks: The watermark image URL by output format name. The
+      watermarked renditions are written to get_watermarked_path.
+    progress: A callback that receives the stage and its completed fraction.
+
+  Returns:
+    The local path of each output by output format name.
+  """
+  streams = probe_streams(video_path)
+  check_streams(streams)
+  keyframes = get_keyframes(video_path, segments)
+  pieces = [
+      piece
+      for segment in segments
+      for piece in plan_segment(
+          segment['startTime'], segment['endTime'], keyframes)
+  ]
+
+  piece_paths = []
+  try:
+    for piece in pieces:
+      piece_path = f'{tmp_folder}piece_{len(piece_paths)}_{file_name}.ts'
+      piece_paths.append(piece_path)
+      cut_piece(video_path, piece_path, piece, streams)
+      # The crop pass below is reported as the last step of the encode.
+      progress('encode', len(piece_paths) / (len(pieces) + 1))
+
+    output_paths = {
+        name: get_output_path(tmp_folder, name, file_name)
+        for name in output_names
+    }
+    concat_pieces(
+        piece_paths, output_paths['landscape'], streams['audio'] is not None)
+  finally:
+    for piece_path in piece_paths:
+      if os.path.exists(piece_path):
+        os.remove(piece_path)
+
+  outputs = [
+      (name, path, None)
+      for name, path in output_paths.items() if name != 'landscape'
+  ]
+  for name, watermark_url in (watermarks or {}).items():
+    outputs.append(
+        (name, get_watermarked_path(output_paths[name]), watermark_url)
+    )
+  crop_outputs(
+      output_paths['landscape'],
+      outputs,
+      streams['video']['width'],
+      streams['video']['height'],
+  )
+  progress('encode', 1)
+  return output_paths
@@ -0,0 +1,113 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the 'License');
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an 'AS IS' BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import stream_copy
+from stream_copy import plan_segment
+
+KEYFRAMES = [0.0, 2.0, 4.0, 6.0, 8.0]
+
+
+def make_streams(audio_codec: str | None = 'aac') -> dict:
+  audio = None
+  if audio_codec is not None:
+    audio = {
+        'codec_name': audio_codec,
+        'profile': 'LC',
+        'sample_rate': '48000',
+        'channels': 2,
+    }
+  return {
+      'video': {
+          'codec_name': 'h264',
+          'profile': 'High',
+          'level': 40,
+          'pix_fmt': 'yuv420p',
+      },
+      'audio': audio,
+  }
+
+
+class PlanSegmentTest(unittest.TestCase):
+
+  def test_start_on_keyframe_is_copied_to_the_end(self):
+    self.assertEqual(
+        plan_segment(2.0, 7.3, KEYFRAMES), [(2.0, 7.3, True)])
+
+  def test_start_snaps_to_a_close_keyframe(self):
+    self.assertEqual(
+        plan_segment(1.95, 3.5, KEYFRAMES), [(2.0, 3.5, True)])
+    self.assertEqual(
+        plan_segment(2.05, 3.5, KEYFRAMES), [(2.0, 3.5, True)])
+
+  def test_start_between_keyframes_is_encoded_up_to_the_next(self):
+    self.assertEqual(
+        plan_segment(1.3, 8.4, KEYFRAMES),
+        [(1.3, 2.0, False), (2.0, 8.4, True)],
+    )
+
+  def test_tail_is_never_encoded(self):
+    for end_time in (4.5, 5.9, 7.99, 9.0):
+      pieces = plan_segment(0.0, end_time, KEYFRAMES)
+      self.assertEqual(pieces, [(0.0, end_time, True)])
+
+  def test_segment_without_keyframe_is_encoded(self):
+    self.assertEqual(
+        plan_segment(2.5, 3.5, KEYFRAMES), [(2.5, 3.5, False)])
+    self.assertEqual(
+        plan_segment(8.5, 9.5, KEYFRAMES), [(8.5, 9.5, False)])
+    self.assertEqual(plan_segment(1.0, 2.0, []), [(1.0, 2.0, False)])
+
+  def test_pieces_cover_the_segment(self):
+    for start_time, end_time in ((0.3, 0.9), (1.3, 6.7), (5.5, 12.0)):
+      pieces = plan_segment(start_time, end_time, KEYFRAMES)
+      self.assertEqual(pieces[0][0], start_time)
+      self.assertEqual(pieces[-1][1], end_time)
+      for previous, piece in zip(pieces, pieces[1:]):
+        self.assertEqual(previous[1], piece[0])
+
+
+class CheckStreamsTest(unittest.TestCase):
+
+  def test_matching_streams(self):
+    stream_copy.check_streams(make_streams())
+    stream_copy.check_streams(make_streams(audio_codec=None))
+
+  def test_unsupported_streams(self):
+    for codec in ('mp3', 'opus'):
+      with self.assertRaises(stream_copy.StreamCopyError):
+        stream_copy.check_streams(make_streams(audio_codec=codec))
+    streams = make_streams()
+    streams['audio']['profile'] = 'HE-AAC'
+    with self.assertRaises(stream_copy.StreamCopyError):
+      stream_copy.check_streams(streams)
+    streams = make_streams()
+    streams['video']['profile'] = 'High 10'
+    with self.assertRaises(stream_copy.StreamCopyError):
+      stream_copy.check_streams(streams)
+    streams = make_streams()
+    streams['video']['codec_name'] = 'hevc'
+    with self.assertRaises(stream_copy.StreamCopyError):
+      stream_copy.check_streams(streams)
+
+  def test_encode_args_match_the_source(self):
+    args = stream_copy._encode_args(make_streams())
+    self.assertEqual(args[args.index('-profile:v') + 1], 'high')
+    self.assertEqual(args[args.index('-level:v') + 1], '4.0')
+    self.assertEqual(args[args.index('-pix_fmt') + 1], 'yuv420p')
+    self.assertEqual(args[args.index('-c:a') + 1], 'aac')
+
+
+if __name__ == '__main__':
+  unittest.main()
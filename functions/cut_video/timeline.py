@@ -0,0 +1,38 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the 'License');
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an 'AS IS' BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Builds the MoviePy timeline of the output video from the segments."""
+import moviepy.editor as mpy
+
+
+def build_timeline(original_clip: mpy.VideoClip, segments: list) -> any:
+  """Builds one flat clip that plays the segments back to back.
+
+  All sub clips are concatenated in a single call, so the timeline is one
+  composite clip with a sorted list of children rather than a chain of
+  nested composites. Looking up a frame costs the same for every segment.
+
+  Args:
+      original_clip: The source video clip.
+      segments: The merged list of transcript dict with startTime and endTime.
+
+  Returns:
+      The clip of the output video.
+  """
+  sub_clips = [
+      original_clip.subclip(segment['startTime'], segment['endTime'])
+      for segment in segments
+  ]
+  if len(sub_clips) == 1:
+    return sub_clips[0]
+  return mpy.concatenate_videoclips(sub_clips)
@@ -0,0 +1,97 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the 'License');
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an 'AS IS' BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Benchmarks render time of the output timeline against segment count.
+
+Compares the flat timeline from build_timeline with the previous approach of
+concatenating one segment at a time. Run with:
+  python timeline_benchmark.py
+"""
+import os
+import time
+import numpy as np
+import moviepy.editor as mpy
+from moviepy.editor import VideoFileClip
+from timeline import build_timeline
+
+TMP_FOLDER = '/tmp/'
+SOURCE_PATH = f'{TMP_FOLDER}timeline_benchmark_source.mp4'
+SOURCE_DURATION = 300
+SOURCE_SIZE = (640, 360)
+SEGMENT_DURATION = 1.5
+SEGMENT_COUNTS = (5, 20, 50)
+
+
+def make_source() -> None:
+  """Writes a synthetic source video once."""
+  if os.path.exists(SOURCE_PATH):
+    return
+  width, height = SOURCE_SIZE
+
+  def make_frame(t):
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    row = (x + t * 40) % 256
+    frame = np.repeat(row[np.newaxis, :], height, axis=0)
+    return np.dstack([frame, frame[::-1], np.full_like(frame, 128)]).astype(
+        np.uint8
+    )
+
+  clip = mpy.VideoClip(make_frame, duration=SOURCE_DURATION).set_fps(24)
+  clip.write_videofile(SOURCE_PATH, logger=None)
+
+
+def make_segments(count: int) -> list:
+  """Spreads count segments evenly over the source."""
+  step = SOURCE_DURATION / count
+  return [
+      {'startTime': index * step, 'endTime': index * step + SEGMENT_DURATION}
+      for index in range(count)
+  ]
+
+
+def build_chained_timeline(original_clip, segments: list) -> any:
+  """The previous implementation, concatenating one segment at a time."""
+  new_clip = None
+  for segment in segments:
+    sub_clip = original_clip.subclip(segment['startTime'], segment['endTime'])
+    new_clip = sub_clip if new_clip is None else mpy.concatenate_videoclips(
+      [new_clip, sub_clip]
+    )
+  return new_clip
+
+
+def time_render(build, segments: list) -> float:
+  """Returns the seconds it takes to build and render the timeline."""
+  original_clip = VideoFileClip(SOURCE_PATH)
+  output_path = f'{TMP_FOLDER}timeline_benchmark_output.mp4'
+  start = time.perf_counter()
+  clip = build(original_clip, segments)
+  clip.write_videofile(output_path, preset='ultrafast', logger=None)
+  elapsed = time.perf_counter() - start
+  original_clip.close()
+  os.remove(output_path)
+  return elapsed
+
+
+def main() -> None:
+  make_source()
+  print(f"{'segments':>8} {'chained (s)':>12} {'flat (s)':>10}")
+  for count in SEGMENT_COUNTS:
+    segments = make_segments(count)
+    chained = time_render(build_chained_timeline, segments)
+    flat = time_render(build_timeline, segments)
+    print(f'{count:>8} {chained:>12.2f} {flat:>10.2f}')
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,136 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the 'License');
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an 'AS IS' BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Per-instance cache of the watermark images.
+
+An image is downloaded once per instance and revalidated with a conditional
+request on its ETag at most every REVALIDATE_SECONDS, so an unchanged image
+is never transferred again. When WATERMARK_REFERENCE_WIDTH is set, the image
+is scaled by output width / reference width, and every scaled variant is
+rendered once and kept next to the original.
+
+The same module is deployed with cut_video and add_watermark; keep the
+copies in sync.
+"""
+import hashlib
+import os
+import subprocess
+import threading
+import time
+import requests
+
+ASSET_FOLDER = '/tmp/watermarks/'
+REVALIDATE_SECONDS = 300
+# The output width the watermark images are designed for, 0 keeps them as is.
+REFERENCE_WIDTH = int(os.environ.get('WATERMARK_REFERENCE_WIDTH', 0))
+FFMPEG_BINARY = os.environ.get('FFMPEG_BINARY', 'ffmpeg')
+FFPROBE_BINARY = os.environ.get('FFPROBE_BINARY', 'ffprobe')
+
+_assets = {}
+_lock = threading.Lock()
+# One lock per image URL, so different images are fetched in parallel.
+_url_locks = {}
+
+
+def _fetch(url: str) -> str:
+  """Returns the local path of the image, downloading it when it changed."""
+  asset = _assets.get(url)
+  if (asset is not None
+      and time.time() - asset['checked_at'] < REVALIDATE_SECONDS):
+    return asset['path']
+
+  headers = {}
+  if asset is not None and asset['etag']:
+    headers['If-None-Match'] = asset['etag']
+  try:
+    response = requests.get(url, headers=headers)
+    response.raise_for_status()
+  except requests.RequestException as e:
+    if asset is None:
+      raise
+    print(f'Using cached watermark {url}, revalidation failed: {e}')
+    return asset['path']
+
+  if asset is not None and response.status_code == 304:
+    asset['checked_at'] = time.time()
+    return asset['path']
+
+  os.makedirs(ASSET_FOLDER, exist_ok=True)
+  path = f'{ASSET_FOLDER}{hashlib.sha256(url.encode()).hexdigest()}.png'
+  with open(f'{path}.partial', 'wb') as file:
+    file.write(response.content)
+  os.replace(f'{path}.partial', path)
+  _assets[url] = {
+      'path': path,
+      'etag': response.headers.get('ETag'),
+      'checked_at': time.time(),
+  }
+  print(f'Watermark {url} downloaded to {path}.')
+  return path
+
+
+def _scale(path: str, output_width: int) -> str:
+  """Returns the variant of the image scaled for output_width."""
+  scaled_path = f'{os.path.splitext(path)[0]}_{output_width}.png'
+  if (os.path.exists(scaled_path)
+      and os.path.getmtime(scaled_path) >= os.path.getmtime(path)):
+    return scaled_path
+  subprocess.run(
+      [
+          FFMPEG_BINARY, '-hide_banner', '-loglevel', 'error', '-y',
+          '-i', path,
+          '-vf', f'scale=trunc(iw*{output_width}/{REFERENCE_WIDTH}):-1',
+          scaled_path,
+      ],
+      check=True,
+  )
+  return scaled_path
+
+
+def get_watermark(url: str, output_width: int | None = None) -> str:
+  """Returns the local path of a watermark image ready for overlay.
+
+  Args:
+    url: The URL of the watermark image.
+    output_width: The width of the video the watermark is overlaid on.
+
+  Returns:
+    The local path of the image, scaled for output_width if
+    WATERMARK_REFERENCE_WIDTH is set.
+  """
+  with _lock:
+    url_lock = _url_locks.setdefault(url, threading.Lock())
+  with url_lock:
+    path = _fetch(url)
+    if not REFERENCE_WIDTH or not output_width:
+      return path
+    return _scale(path, output_width)
+
+
+def probe_width(video_path: str) -> int | None:
+  """Returns the width of the video, only when watermarks are scaled."""
+  if not REFERENCE_WIDTH:
+    return None
+  output = subprocess.run(
+      [
+          FFPROBE_BINARY, '-v', 'error',
+          '-select_streams', 'v:0',
+          '-show_entries', 'stream=width',
+          '-of', 'csv=p=0',
+          video_path,
+      ],
+      check=True,
+      capture_output=True,
+      text=True,
+  ).stdout
+  return int(output.strip())
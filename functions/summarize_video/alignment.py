@@ -0,0 +1,331 @@
+# Copyright 2023 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Fuzzy alignment of the words of an LLM summary to the transcript words.
+
+The original scan walks the transcript and the summary with two pointers
+and a fixed one or two word lookahead. Once the model drops or rephrases a
+few words, the pointers lose sync and the scan skips or rescans long parts
+of the transcript.
+
+align_clips instead maps every word to an integer id, like a diff over
+token ids. A summary word is anchored at the transcript positions where it
+is followed by one of the next two summary words, at most PAIR_GAP
+positions later, and an anchor is scored by how many of the next LOOKAHEAD
+summary words follow it within LOOKAHEAD_SPAN positions each. The heaviest
+chain of anchors that increase in both the summary and the transcript is
+kept, so a wrong anchor cannot push the rest of the summary off the
+transcript. The summary words between two anchors are matched in the same
+bounded window. Pairs are only collected for the words of the summary, so
+memory is linear in the transcript length.
+
+Matched words that are at most MAX_FILL_GAP words apart are joined into one
+clip together with the words in between, which covers words the model
+dropped or replaced. Words with shouldKeep are always part of a clip. Every
+clip reports a confidence: the share of its words that were matched to the
+summary or kept by the user.
+
+The fuzzy alignment trades speed for recall. It indexes the whole
+transcript and scores every anchor candidate, so it is 2 to 4 times slower
+than the scan: about 13 ms against 3 ms for 5,000 words and 46 ms against
+19 ms for 50,000 words, without the debug output of
+get_clips_from_transcript. In exchange it places about 98% of the summary
+words that come from the transcript, where the scan places 6% to 30% once
+10% of the words are dropped or rephrased, see alignment_benchmark.py.
+Both costs are small next to the LLM call, but the scan stays the default.
+"""
+import bisect
+import re
+
+ALIGNMENT_SCAN = 'scan'
+ALIGNMENT_FUZZY = 'fuzzy'
+ALIGNMENTS = (ALIGNMENT_SCAN, ALIGNMENT_FUZZY)
+PAIR_GAP = 2
+MAX_PAIR_COUNT = 16
+COMMON_PAIR_FACTOR = 4
+LOOKAHEAD = 4
+LOOKAHEAD_SPAN = 3
+MIN_ANCHOR_SCORE = 3
+MAX_FILL_GAP = 2
+
+
+def normalize(text: str) -> str:
+  """Normalizes a word the way the summary words are extracted."""
+  return re.sub('[,.?!]', '', text).lower()
+
+
+class _Index:
+  """Positions of every word and of close pairs of words in the transcript.
+
+  A pair is two words at most PAIR_GAP positions apart, so that a pair still
+  matches when the summary drops or replaces the word in between. Pairs are
+  only looked up for the summary, so they are collected on first use.
+  """
+
+  def __init__(self, transcript_words: list):
+    texts = [word['text'] for word in transcript_words]
+    self.ids = {}
+    raw_ids = {
+        text: self.ids.setdefault(normalize(text), len(self.ids))
+        for text in dict.fromkeys(texts)
+    }
+    self.text_ids = [raw_ids[text] for text in texts]
+    self.positions = [[] for _ in self.ids]
+    for position, text_id in enumerate(self.text_ids):
+      self.positions[text_id].append(position)
+    self._pairs = {}
+
+  def get_pair_positions(self, text_id: int, next_id: int, gap: int) -> list:
+    """Returns the positions of a pair, or [] if it is too common.
+
+    Args:
+      text_id: The id of the first word.
+      next_id: The id of the second word.
+      gap: The distance from the first to the second word.
+
+    Returns:
+      The positions of the first word, or [] if the pair occurs more than
+      MAX_PAIR_COUNT times.
+    """
+    key = (text_id, next_id, gap)
+    if key not in self._pairs:
+      text_ids = self.text_ids
+      count = len(self.positions[text_id])
+      next_count = len(self.positions[next_id])
+      if count * next_count > COMMON_PAIR_FACTOR * MAX_PAIR_COUNT * len(
+          text_ids):
+        # Two words this common are expected to pair up far too often.
+        self._pairs[key] = []
+        return []
+      stop = len(text_ids) - gap
+      # Walks the rarer of the two words.
+      if count <= next_count:
+        pair_positions = [
+            position for position in self.positions[text_id]
+            if position < stop and text_ids[position + gap] == next_id
+        ]
+      else:
+        pair_positions = [
+            position - gap for position in self.positions[next_id]
+            if position >= gap and text_ids[position - gap] == text_id
+        ]
+      if len(pair_positions) > MAX_PAIR_COUNT:
+        pair_positions = []
+      self._pairs[key] = pair_positions
+    return self._pairs[key]
+
+  def get_id(self, word: str) -> int:
+    """Returns the id of the word, or -1 if it is not in the transcript."""
+    return self.ids.get(normalize(word), -1)
+
+  def find(self, text_id: int, start: int, stop: int) -> int | None:
+    """Returns the first position of the id in [start, stop), if any."""
+    positions = self.positions[text_id]
+    index = bisect.bisect_left(positions, start)
+    if index < len(positions) and positions[index] < stop:
+      return positions[index]
+    return None
+
+  def get_candidates(self, summary_ids: list, summary_idx: int) -> set:
+    """Returns the positions where a summary word could be anchored.
+
+    These are the positions where the word is followed closely by one of
+    the next PAIR_GAP summary words. Pairs that occur more than
+    MAX_PAIR_COUNT times are too common to anchor anything.
+    """
+    text_id = summary_ids[summary_idx]
+    candidates = set()
+    if len(self.positions[text_id]) == 1:
+      candidates.update(self.positions[text_id])
+    for next_id in summary_ids[summary_idx + 1:summary_idx + 1 + PAIR_GAP]:
+      if next_id < 0:
+        continue
+      for gap in range(1, PAIR_GAP + 1):
+        candidates.update(self.get_pair_positions(text_id, next_id, gap))
+    return candidates
+
+
+def _follow(
+    index: _Index, summary_ids: list, summary_start: int, summary_stop: int,
+    position: int, stop: int) -> list:
+  """Matches summary words that closely follow a matched position.
+
+  Args:
+    index: The index of the transcript.
+    summary_ids: The word ids of the summary.
+    summary_start: The first summary word to match.
+    summary_stop: The summary word to stop before.
+    position: The matched position to follow.
+    stop: The transcript position to stop before.
+
+  Returns:
+    The matched positions, in increasing order.
+  """
+  matched = []
+  for text_id in summary_ids[summary_start:summary_stop]:
+    if text_id < 0:
+      continue
+    next_position = index.find(
+        text_id, position + 1, min(position + 1 + LOOKAHEAD_SPAN, stop)
+    )
+    if next_position is None:
+      continue
+    matched.append(next_position)
+    position = next_position
+  return matched
+
+
+def _get_heaviest_chain(anchors: list, summary_count: int) -> list:
+  """Picks the anchors with increasing positions and summary words.
+
+  The chain with the highest total score is found like a longest increasing
+  subsequence, with a Fenwick tree of the best chain ending before every
+  summary word.
+
+  Args:
+    anchors: Tuples of (position, summary index, score).
+    summary_count: The number of summary words.
+
+  Returns:
+    The anchors of the chain, in increasing order.
+  """
+  tree = [(0, -1)] * (summary_count + 1)
+  best = []
+  anchors = sorted(anchors)
+  group_start = 0
+  while group_start < len(anchors):
+    # Anchors at the same position cannot follow each other.
+    group_stop = group_start
+    while (group_stop < len(anchors)
+           and anchors[group_stop][0] == anchors[group_start][0]):
+      group_stop += 1
+    for anchor_idx in range(group_start, group_stop):
+      _, summary_idx, score = anchors[anchor_idx]
+      total, parent = 0, -1
+      node = summary_idx
+      while node > 0:
+        total, parent = max((total, parent), tree[node])
+        node -= node & -node
+      best.append((total + score, parent))
+    for anchor_idx in range(group_start, group_stop):
+      node = anchors[anchor_idx][1] + 1
+      while node <= summary_count:
+        tree[node] = max(tree[node], (best[anchor_idx][0], anchor_idx))
+        node += node & -node
+    group_start = group_stop
+
+  chain = []
+  anchor_idx = max(range(len(best)), key=lambda idx: best[idx][0], default=-1)
+  while anchor_idx >= 0:
+    chain.append(anchors[anchor_idx])
+    anchor_idx = best[anchor_idx][1]
+  return chain[::-1]
+
+
+def match_words(transcript_words: list, summary_words: list) -> list:
+  """Places the summary words on increasing transcript positions.
+
+  Every summary word is anchored at the positions from
+  _Index.get_candidates, scored by how many of the next LOOKAHEAD summary
+  words follow it. The heaviest chain of anchors that increase in both the
+  summary and the transcript is kept, and the summary words between two
+  anchors are matched right after the previous match.
+
+  Args:
+    transcript_words: The words of the transcript.
+    summary_words: The words extracted from the LLM response.
+
+  Returns:
+    The sorted transcript positions that were matched.
+  """
+  index = _Index(transcript_words)
+  summary_ids = [index.get_id(word) for word in summary_words]
+  anchors = []
+  for summary_idx, text_id in enumerate(summary_ids):
+    if text_id < 0:
+      continue
+    for position in index.get_candidates(summary_ids, summary_idx):
+      score = 1 + len(_follow(
+          index, summary_ids, summary_idx + 1, summary_idx + 1 + LOOKAHEAD,
+          position, len(transcript_words)))
+      if score >= MIN_ANCHOR_SCORE or len(index.positions[text_id]) == 1:
+        anchors.append((position, summary_idx, score))
+
+  chain = _get_heaviest_chain(anchors, len(summary_ids))
+  matched = []
+  for chain_idx, (position, summary_idx, _) in enumerate(chain):
+    if chain_idx + 1 < len(chain):
+      next_position, next_summary_idx, _ = chain[chain_idx + 1]
+    else:
+      next_position, next_summary_idx = len(transcript_words), len(summary_ids)
+    matched.append(position)
+    matched.extend(_follow(
+        index, summary_ids, summary_idx + 1, next_summary_idx, position,
+        next_position))
+  return matched
+
+
+def make_clip(words: list, matched_count: int) -> dict:
+  """Builds a clip from consecutive transcript words."""
+  return {
+      'text': ' '.join([word.get('text') for word in words]),
+      'startTime': words[0].get('startTime'),
+      'endTime': words[-1].get('endTime'),
+      'duration': words[-1].get('endTime') - words[0].get('startTime'),
+      'words': words,
+      'confidence': matched_count / len(words),
+  }
+
+
+def align_clips(transcript_words: list, summary_words: list) -> list:
+  """Aligns the summary to the transcript and groups the words into clips.
+
+  Args:
+    transcript_words: The words of the transcript.
+    summary_words: The words extracted from the LLM response.
+
+  Returns:
+    The clips in the format of get_clips_from_transcript, each with an
+    additional confidence between 0 and 1.
+  """
+  matched = set(match_words(transcript_words, summary_words))
+  clips = []
+  clip_start = None
+  last_included = None
+  matched_count = 0
+
+  def close_clip():
+    if clip_start is not None and last_included > clip_start:
+      clips.append(make_clip(
+          transcript_words[clip_start:last_included + 1], matched_count
+      ))
+
+  for position, word in enumerate(transcript_words):
+    is_matched = position in matched
+    if not is_matched and word.get('shouldKeep') != True:
+      continue
+    # Only the gap between two summary matches is filled.
+    is_continued = last_included is not None and (
+        position == last_included + 1
+        or (is_matched and last_included in matched
+            and position - last_included - 1 <= MAX_FILL_GAP)
+    )
+    if not is_continued:
+      close_clip()
+      clip_start = position
+      matched_count = 0
+    last_included = position
+    matched_count += 1
+  close_clip()
+  return clips
@@ -0,0 +1,113 @@
+# Copyright 2023 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Benchmarks the alignment of a summary against the transcript words.
+
+Compares the word by word scan of DefaultLanguage with alignment.align_clips
+on synthetic transcripts, where the summary keeps a few sentences of the
+transcript and drops or rephrases some of their words. Recall is the share
+of the kept transcript words that end up in a clip, precision the share of
+clip words that were kept. The fuzzy alignment is expected to be slower
+and to have a much higher recall. Run with:
+  python alignment_benchmark.py
+"""
+import contextlib
+import io
+import random
+import time
+import alignment
+from languages import DefaultLanguage
+
+WORD_COUNTS = (5000, 10000, 20000, 50000)
+VOCABULARY_SIZE = 3000
+SENTENCE_COUNT = 40
+SENTENCE_WORDS = (6, 15)
+EDIT_RATE = 0.1
+REPEATS = 3
+
+
+def make_transcript(rng: random.Random, word_count: int) -> list:
+  """Makes words with a skewed vocabulary, like spoken language."""
+  vocabulary = [f'word{index}' for index in range(VOCABULARY_SIZE)]
+  weights = [1 / (rank + 1) for rank in range(VOCABULARY_SIZE)]
+  texts = rng.choices(vocabulary, weights=weights, k=word_count)
+  return [
+      {'text': text, 'startTime': index * 0.4, 'endTime': index * 0.4 + 0.3}
+      for index, text in enumerate(texts)
+  ]
+
+
+def make_summary(rng: random.Random, words: list) -> tuple:
+  """Keeps sentences of the transcript with some words dropped or replaced.
+
+  Returns:
+    The summary text and the positions of the kept transcript words.
+  """
+  starts = sorted(rng.sample(range(len(words) - SENTENCE_WORDS[1]),
+                             SENTENCE_COUNT))
+  sentences = []
+  kept = set()
+  for start in starts:
+    stop = start + rng.randint(*SENTENCE_WORDS)
+    sentence = []
+    for position in range(start, stop):
+      roll = rng.random()
+      if roll < EDIT_RATE / 2:
+        continue
+      if roll < EDIT_RATE:
+        sentence.append('rephrased')
+        continue
+      sentence.append(words[position]['text'])
+      kept.add(position)
+    sentences.append(' '.join(sentence) + '.')
+  return '\n'.join(sentences), kept
+
+
+def score(words: list, clips: list, kept: set) -> tuple:
+  """Returns the recall and precision of the clip words."""
+  positions = {id(word): index for index, word in enumerate(words)}
+  selected = {positions[id(word)] for clip in clips for word in clip['words']}
+  recall = len(selected & kept) / len(kept)
+  precision = len(selected & kept) / len(selected) if selected else 0
+  return recall, precision
+
+
+def time_alignment(name: str, words: list, summary: str) -> tuple:
+  """Returns the best time in seconds and the clips of the alignment."""
+  language = DefaultLanguage(name)
+  best = None
+  for _ in range(REPEATS):
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+      clips = language.get_clips_from_transcript(words, summary, [])
+    elapsed = time.perf_counter() - start
+    best = elapsed if best is None else min(best, elapsed)
+  return best, clips
+
+
+def main() -> None:
+  rng = random.Random(19)
+  print(f"{'words':>6} {'alignment':>9} {'time (ms)':>10} {'recall':>7} "
+        f"{'precision':>9}")
+  for word_count in WORD_COUNTS:
+    words = make_transcript(rng, word_count)
+    summary, kept = make_summary(rng, words)
+    for name in alignment.ALIGNMENTS:
+      elapsed, clips = time_alignment(name, words, summary)
+      recall, precision = score(words, clips, kept)
+      print(f'{word_count:>6} {name:>9} {elapsed * 1000:>10.1f} '
+            f'{recall:>7.2f} {precision:>9.2f}')
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,113 @@
+# Copyright 2023 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import random
+import unittest
+import alignment
+from languages import DefaultLanguage
+
+
+def make_words(text: str) -> list:
+  return [
+      {"text": text, "startTime": index, "endTime": index + 1}
+      for index, text in enumerate(text.split(" "))
+  ]
+
+
+class AlignmentTest(unittest.TestCase):
+
+  def test_exact_sentence(self):
+    words = make_words("so the new Pixel has the best camera we have built")
+    clips = alignment.align_clips(words, ["the", "new", "pixel", "has"])
+    self.assertEqual(len(clips), 1)
+    self.assertEqual(clips[0]["text"], "the new Pixel has")
+    self.assertEqual(clips[0]["startTime"], 1)
+    self.assertEqual(clips[0]["endTime"], 5)
+    self.assertEqual(clips[0]["duration"], 4)
+    self.assertEqual(clips[0]["confidence"], 1)
+    self.assertIs(clips[0]["words"][0], words[1])
+
+  def test_rephrased_words_are_filled(self):
+    words = make_words("the camera is the best we have ever built for Pixel")
+    summary = ["the", "camera", "is", "truly", "best", "we", "ever", "built"]
+    clips = alignment.align_clips(words, summary)
+    self.assertEqual(
+        [clip["text"] for clip in clips],
+        ["the camera is the best we have ever built"],
+    )
+    self.assertAlmostEqual(clips[0]["confidence"], 7 / 9)
+
+  def test_common_words_do_not_pull_the_alignment(self):
+    words = make_words(
+        "the the the battery lasts all day and the screen is brighter "
+        "than the screen of the last phone"
+    )
+    summary = ["the", "screen", "is", "brighter", "than"]
+    clips = alignment.align_clips(words, summary)
+    self.assertEqual(
+        [clip["text"] for clip in clips], ["the screen is brighter than"]
+    )
+    self.assertEqual(clips[0]["startTime"], 8)
+
+  def test_should_keep_words(self):
+    words = make_words("hello everyone today we launch the new Pixel")
+    words[0]["shouldKeep"] = True
+    words[1]["shouldKeep"] = True
+    clips = alignment.align_clips(words, ["the", "new", "pixel"])
+    self.assertEqual(
+        [clip["text"] for clip in clips],
+        ["hello everyone", "the new Pixel"],
+    )
+
+  def test_single_words_are_dropped(self):
+    words = make_words("we launch the new Pixel today")
+    self.assertEqual(alignment.align_clips(words, ["today"]), [])
+    self.assertEqual(alignment.align_clips([], ["today"]), [])
+    self.assertEqual(alignment.align_clips(words, []), [])
+
+  def test_recovers_edited_sentences(self):
+    rng = random.Random(19)
+    vocabulary = [f"word{index}" for index in range(200)]
+    weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+    texts = rng.choices(vocabulary, weights=weights, k=3000)
+    words = make_words(" ".join(texts))
+    summary = []
+    kept = set()
+    for start in sorted(rng.sample(range(0, 2980, 20), 15)):
+      for position in range(start, start + 12):
+        if rng.random() < 0.1:
+          summary.append("rephrased")
+          continue
+        summary.append(texts[position])
+        kept.add(position)
+    clips = alignment.align_clips(words, summary)
+    selected = {
+        word["startTime"] for clip in clips for word in clip["words"]
+    }
+    self.assertGreater(len(selected & kept), 0.9 * len(kept))
+    self.assertGreater(len(selected & kept), 0.85 * len(selected))
+
+  def test_default_language_alignment(self):
+    words = make_words("the new Pixel has the best camera")
+    language = DefaultLanguage(alignment.ALIGNMENT_FUZZY)
+    clips = language.get_clips_from_transcript(
+        words, "Transcript: The new Pixel has the best camera.", []
+    )
+    self.assertEqual(clips[0]["text"], "the new Pixel has the best camera")
+    with self.assertRaises(ValueError):
+      DefaultLanguage("diff")
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,214 @@
+# Copyright 2023 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Fits the clips of a summary into the requested duration without the LLM.
+
+The LLM decides which lines matter, but it is not good at counting seconds.
+Instead of asking it again, fit_clips treats the clips from
+get_clips_from_transcript and the transcript lines they do not cover as the
+items of a knapsack, with the duration of each item as its weight:
+
+  - Clips with a shouldKeep word are always part of the result.
+  - Every clip of the summary is worth about the same, a little more the
+    earlier it is, so as many clips as possible are kept and the later ones
+    are trimmed first when the summary is too long.
+  - Restored lines cost a little, and earlier lines cost less than later
+    ones, so lines are only restored to reach the minimum duration.
+  - match_with_video_shots runs the last clip to the end of the video, so
+    every item weighs up to the end of the video when it is the last one.
+
+A dynamic program over the total duration, in steps of DURATION_STEP
+seconds, picks the items with the highest value whose total duration is
+within the bounds, or as close to them as possible. The result is
+deterministic for the same clips and bounds.
+"""
+import math
+from typing import Callable
+
+DURATION_STEP = 0.1
+
+
+def _overlaps(line: dict, clips: list) -> bool:
+  return any(
+      clip['startTime'] < line['endTime']
+      and line['startTime'] < clip['endTime']
+      for clip in clips
+  )
+
+
+def _is_kept(clip: dict) -> bool:
+  return any(word.get('shouldKeep') == True for word in clip.get('words', []))
+
+
+def get_candidates(clips: list, input_transcript: list) -> tuple[list, list]:
+  """Returns the clips and the transcript lines they do not cover.
+
+  Args:
+    clips: The clips from get_clips_from_transcript.
+    input_transcript: The full transcript.
+
+  Returns:
+    The candidates sorted by start time, and for each of them whether it is
+    a clip of the summary.
+  """
+  candidates = [(clip, True) for clip in clips]
+  for line in input_transcript:
+    if not line.get('words') or _overlaps(line, clips):
+      continue
+    candidates.append(({
+        'text': line['text'],
+        'startTime': line['startTime'],
+        'endTime': line['endTime'],
+        'duration': line['endTime'] - line['startTime'],
+        'words': line['words'],
+    }, False))
+  candidates.sort(key=lambda candidate: candidate[0]['startTime'])
+  return ([candidate for candidate, _ in candidates],
+          [is_selected for _, is_selected in candidates])
+
+
+def select(durations: list,
+           values: list,
+           is_required: list,
+           duration_bounds: tuple[float, float],
+           last_durations: list | None = None) -> list:
+  """Solves the knapsack over the durations.
+
+  Args:
+    durations: The duration of every item in seconds.
+    values: The value of every item.
+    is_required: Whether every item has to be selected.
+    duration_bounds: The minimum and maximum total duration.
+    last_durations: The duration of every item when it is the last selected
+      one, if that differs from its duration, see fit_clips.
+
+  Returns:
+    The indices of the selected items, in increasing order.
+  """
+  if last_durations is None:
+    last_durations = durations
+  weights = [max(0, round(duration / DURATION_STEP)) for duration in durations]
+  last_weights = [
+      max(0, round(duration / DURATION_STEP)) for duration in last_durations
+  ]
+  required = [index for index, flag in enumerate(is_required) if flag]
+  base_weight = sum(weights[index] for index in required)
+  min_weight = math.ceil(duration_bounds[0] / DURATION_STEP - 1e-9)
+  max_weight = math.floor(duration_bounds[1] / DURATION_STEP + 1e-9)
+  # When nothing fits, the closest total above the bounds drops below them
+  # without any one of the optional items before its last item, so the
+  # items before the last one weigh less than this capacity.
+  capacity = max(
+      base_weight,
+      max_weight + max(
+          [weight for weight, flag in zip(weights, is_required) if not flag],
+          default=0,
+      ),
+  )
+
+  def get_rank(total: int, value: float) -> tuple:
+    # Closest to the bounds, then most valuable, then longest.
+    miss = max(min_weight - total, total - max_weight, 0)
+    return (-miss, value, total)
+
+  # The selection is built as the items before the last one, then the last
+  # one. best[weight] is the highest value of the items before the current
+  # item with that total weight, and taken[item][weight] whether the item
+  # is part of it.
+  best = [None] * (capacity + 1)
+  best[0] = 0
+  taken = []
+  # The empty selection, or the last item and the weight of the items
+  # before it.
+  last = None
+  last_total = 0
+  last_rank = None if required else get_rank(0, 0)
+  last_required = max(required, default=-1)
+  for index, weight in enumerate(weights):
+    if index >= last_required:
+      for total in range(capacity + 1):
+        if best[total] is None:
+          continue
+        rank = get_rank(total + last_weights[index],
+                        best[total] + values[index])
+        if last_rank is None or rank > last_rank:
+          last, last_total, last_rank = index, total, rank
+    item_taken = [False] * (capacity + 1)
+    if is_required[index]:
+      shifted = [None] * (capacity + 1)
+      for total in range(capacity - weight, -1, -1):
+        if best[total] is not None:
+          shifted[total + weight] = best[total] + values[index]
+          item_taken[total + weight] = True
+      best = shifted
+    else:
+      for total in range(capacity, weight - 1, -1):
+        if best[total - weight] is None:
+          continue
+        value = best[total - weight] + values[index]
+        if best[total] is None or value > best[total]:
+          best[total] = value
+          item_taken[total] = True
+    taken.append(item_taken)
+
+  if last is None:
+    return []
+  selected = [last]
+  total = last_total
+  for item in range(last - 1, -1, -1):
+    if taken[item][total]:
+      selected.append(item)
+      total -= weights[item]
+  return sorted(selected)
+
+
+def fit_clips(clips: list,
+              input_transcript: list,
+              duration_bounds: tuple[float, float],
+              match: Callable[[list], list],
+              extends_last: bool = False) -> list:
+  """Trims or restores clips so that their duration fits the bounds.
+
+  Args:
+    clips: The clips from get_clips_from_transcript.
+    input_transcript: The full transcript.
+    duration_bounds: The minimum and maximum duration of the video.
+    match: Returns the candidates as they will be cut, e.g. after
+      match_with_video_shots.
+    extends_last: Whether match runs the last clip to the end of the video,
+      like match_with_video_shots does. Every candidate then weighs up to
+      the end of the video when it is the last one selected.
+
+  Returns:
+    The selected candidates, in the order of the video.
+  """
+  candidates, is_selected = get_candidates(clips, input_transcript)
+  count = len(candidates)
+  values = [
+      count * count + count - index if selected else -(index + 1)
+      for index, selected in enumerate(is_selected)
+  ]
+  matched = match(candidates)
+  last_durations = None
+  if extends_last and matched:
+    # The start of a clip does not depend on the clips around it.
+    end_time = matched[-1]['endTime']
+    last_durations = [end_time - clip['startTime'] for clip in matched]
+  indices = select(
+      [clip['duration'] for clip in matched],
+      values,
+      [_is_kept(candidate) for candidate in candidates],
+      duration_bounds,
+      last_durations,
+  )
+  return [candidates[index] for index in indices]
@@ -0,0 +1,143 @@
+# Copyright 2023 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import itertools
+import random
+import unittest
+import duration_fitting
+import shot_matching
+
+
+def make_line(start_time: float, end_time: float, text: str) -> dict:
+  return {
+      "text": text,
+      "startTime": start_time,
+      "endTime": end_time,
+      "duration": end_time - start_time,
+      "words": [{"text": text, "startTime": start_time, "endTime": end_time}],
+  }
+
+
+def match(candidates: list) -> list:
+  return candidates
+
+
+def get_texts(clips: list) -> list:
+  return [clip["text"] for clip in clips]
+
+
+class DurationFittingTest(unittest.TestCase):
+
+  def setUp(self):
+    self.transcript = [
+        make_line(0, 4, "a"),
+        make_line(4, 10, "b"),
+        make_line(10, 13, "c"),
+        make_line(13, 20, "d"),
+        make_line(20, 25, "e"),
+    ]
+
+  def test_keeps_clips_within_bounds(self):
+    clips = [self.transcript[1], self.transcript[3]]
+    fitted = duration_fitting.fit_clips(
+        clips, self.transcript, (10, 15), match)
+    self.assertEqual(get_texts(fitted), ["b", "d"])
+
+  def test_trims_the_latest_clips(self):
+    clips = self.transcript[1:]
+    fitted = duration_fitting.fit_clips(
+        clips, self.transcript, (10, 16), match)
+    self.assertEqual(get_texts(fitted), ["b", "c", "d"])
+
+  def test_restores_the_earliest_lines(self):
+    clips = [self.transcript[3]]
+    fitted = duration_fitting.fit_clips(
+        clips, self.transcript, (10, 12), match)
+    self.assertEqual(get_texts(fitted), ["a", "d"])
+    self.assertIsNot(fitted[0], self.transcript[0])
+
+  def test_should_keep_clips_stay(self):
+    self.transcript[4]["words"][0]["shouldKeep"] = True
+    clips = self.transcript[:]
+    fitted = duration_fitting.fit_clips(
+        clips, self.transcript, (8, 10), match)
+    self.assertEqual(get_texts(fitted), ["a", "e"])
+
+  def test_counts_the_last_clip_up_to_the_end_of_the_video(self):
+    transcript = [
+        make_line(start, start + 5, f"line{start}") for start in range(0, 50, 5)
+    ]
+    words = [word for line in transcript for word in line["words"]]
+    video_shots = [
+        {"start_time": start, "end_time": start + 5}
+        for start in range(0, 50, 5)
+    ]
+
+    def match_with_video_shots(candidates: list) -> list:
+      return shot_matching.match_with_video_shots(
+          video_shots, candidates, words)
+
+    fitted = duration_fitting.fit_clips(
+        transcript[:3], transcript, (10, 15), match_with_video_shots,
+        extends_last=True)
+    durations = [clip["duration"] for clip in match_with_video_shots(fitted)]
+    self.assertEqual(get_texts(fitted), ["line0", "line5", "line45"])
+    self.assertEqual(durations, [5, 5, 5])
+
+  def assert_select_matches_brute_force(self, extends_last: bool):
+    rng = random.Random(24)
+    for _ in range(200):
+      count = rng.randint(0, 7)
+      durations = [rng.randint(0, 60) / 10 for _ in range(count)]
+      last_durations = durations
+      if extends_last:
+        last_durations = [
+            duration + rng.randint(0, 60) / 10 for duration in durations
+        ]
+      values = [rng.randint(-5, 20) for _ in range(count)]
+      is_required = [rng.random() < 0.15 for _ in range(count)]
+      min_duration = rng.randint(0, 150) / 10
+      bounds = (min_duration, min_duration + rng.randint(0, 60) / 10)
+
+      def get_rank(indices: tuple) -> tuple:
+        total = sum(round(durations[index] * 10) for index in indices[:-1])
+        total += sum(round(last_durations[index] * 10)
+                     for index in indices[-1:])
+        miss = max(round(bounds[0] * 10) - total,
+                   total - round(bounds[1] * 10), 0)
+        return (-miss, sum(values[index] for index in indices), total)
+
+      subsets = [
+          indices
+          for size in range(count + 1)
+          for indices in itertools.combinations(range(count), size)
+          if all(index in indices
+                 for index in range(count) if is_required[index])
+      ]
+      selected = duration_fitting.select(
+          durations, values, is_required, bounds,
+          last_durations if extends_last else None)
+      self.assertEqual(
+          get_rank(tuple(selected)), max(map(get_rank, subsets)),
+          (durations, last_durations, values, is_required, bounds))
+
+  def test_select_matches_brute_force(self):
+    self.assert_select_matches_brute_force(extends_last=False)
+
+  def test_select_with_last_durations_matches_brute_force(self):
+    self.assert_select_matches_brute_force(extends_last=True)
+
+
+if __name__ == "__main__":
+  unittest.main()
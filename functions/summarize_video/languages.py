@@ -12,8 +12,14 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import alignment
+import bisect
 import re
 
+THAI_MATCH_SCAN = 'scan'
+THAI_MATCH_INDEX = 'index'
+THAI_MATCHES = (THAI_MATCH_SCAN, THAI_MATCH_INDEX)
+
 class Language:
   def get_clips_from_transcript(
       self,
@@ -31,6 +37,22 @@ class Language:
     Return:
       A list of words from the given summary.
     """
+    words = list(self.normalize_summary(summary))
+    print(f'words: {words}')
+    return words
+
+  def normalize_summary(self, summary: str) -> tuple:
+    """Returns the words of the summary that the clips are matched with.
+
+    Summaries with the same words give the same clips, so the words also
+    serve as a memo key for the clips.
+
+    Args:
+      summary: A summary of the transcript.
+
+    Return:
+      A tuple of words from the given summary.
+    """
     # Remove the trailing "transcript:" from the summarized transcript from LLM
     if summary.lstrip().lower().startswith('transcript:'):
       summary = summary.lower().replace('transcript:', '', 1)
@@ -39,14 +61,24 @@ class Language:
     summary = summary.replace('\n', ' ')
 
     words = summary.split(' ')
-    words = list(filter(lambda word: len(word) > 0, words))
-    print(f'words: {words}')
-    return words
+    return tuple(filter(lambda word: len(word) > 0, words))
 
 class DefaultLanguage(Language):
   _SHOULD_KEEP = 'shouldKeep'
   _TEXT = 'text'
 
+  def __init__(self, alignment_name: str = alignment.ALIGNMENT_SCAN):
+    """Initializes the language.
+
+    Args:
+      alignment_name: alignment.ALIGNMENT_SCAN for the original word by word
+        scan, or alignment.ALIGNMENT_FUZZY for alignment.align_clips, which
+        is slower but recovers far more of a rephrased summary.
+    """
+    if alignment_name not in alignment.ALIGNMENTS:
+      raise ValueError(f'Unknown alignment: {alignment_name}')
+    self.alignment_name = alignment_name
+
   def get_clips_from_transcript(
       self,
       transcript_words: list,
@@ -73,6 +105,8 @@ class DefaultLanguage(Language):
     output = []
 
     summary_words = super()._extract_words_from_str(shortened_text)
+    if self.alignment_name == alignment.ALIGNMENT_FUZZY:
+      return alignment.align_clips(transcript_words, summary_words)
 
     word_ptr = 0
 
@@ -135,7 +169,62 @@ class DefaultLanguage(Language):
       })
     return output
 
+class _LineIndex:
+  """Finds the transcript lines that contain a word of the summary.
+
+  Thai is written without spaces, so a word extracted from the summary is
+  usually a run of several transcript words. A line matches the summary
+  word when the text of one of its words is a substring of it. The index
+  maps every word text to the sorted numbers of the lines that contain it,
+  and only the substrings of the summary word with the length of a word
+  text are looked up.
+  """
+
+  def __init__(self, original_transcript: list):
+    self._lines = {}
+    for line_idx, line in enumerate(original_transcript):
+      for word in line['words']:
+        lines = self._lines.setdefault(word['text'], [])
+        if not lines or lines[-1] != line_idx:
+          lines.append(line_idx)
+    self._lengths = sorted({len(text) for text in self._lines})
+    self._found = {}
+
+  def _find_texts(self, summary_word: str) -> list:
+    """Returns the line lists of the word texts inside the summary word."""
+    if summary_word not in self._found:
+      found = {}
+      for length in self._lengths:
+        if length > len(summary_word):
+          break
+        for start in range(len(summary_word) - length + 1):
+          text = summary_word[start:start + length]
+          if text in self._lines:
+            found[text] = self._lines[text]
+      self._found[summary_word] = list(found.values())
+    return self._found[summary_word]
+
+  def find(self, summary_word: str, start: int) -> int | None:
+    """Returns the first line from start that matches the summary word."""
+    first = None
+    for lines in self._find_texts(summary_word):
+      index = bisect.bisect_left(lines, start)
+      if index < len(lines) and (first is None or lines[index] < first):
+        first = lines[index]
+    return first
+
 class Thai(Language):
+  def __init__(self, match_name: str = THAI_MATCH_INDEX):
+    """Initializes the language.
+
+    Args:
+      match_name: THAI_MATCH_SCAN for the original line by line scan, or
+        THAI_MATCH_INDEX for the same matching through a _LineIndex.
+    """
+    if match_name not in THAI_MATCHES:
+      raise ValueError(f'Unknown Thai match: {match_name}')
+    self.match_name = match_name
+
   def get_clips_from_transcript(
       self,
       transcript_words: list,
@@ -164,6 +253,8 @@ class Thai(Language):
     latest_added_scene = -1
 
     extracted_words = super()._extract_words_from_str(shortened_text)
+    if self.match_name == THAI_MATCH_INDEX:
+      return self._get_clips_from_index(extracted_words, original_transcript)
 
     while words_ptr < len(extracted_words):
       if original_ptr >= len(original_transcript) and latest_added_scene < 0:
@@ -187,6 +278,44 @@ class Thai(Language):
 
     return matched_result
 
+  def _get_clips_from_index(
+      self,
+      extracted_words: list,
+      original_transcript: list) -> list:
+    """Matches like get_clips_from_transcript without rescanning the lines.
+
+    The pointer moves exactly like in the line by line scan, but the next
+    matching line is found through a _LineIndex and the matched lines are
+    kept in a set of texts, so the time is about linear in the length of
+    the transcript and the summary.
+    """
+    line_index = _LineIndex(original_transcript)
+    matched_result = []
+    matched_texts = set()
+    original_ptr = 0
+    latest_added_scene = -1
+
+    for word in extracted_words:
+      if original_ptr >= len(original_transcript) and latest_added_scene < 0:
+        original_ptr = 0
+      if (original_ptr >= len(original_transcript)
+          or original_ptr > latest_added_scene and latest_added_scene > 0):
+        original_ptr = latest_added_scene
+      line_idx = line_index.find(word, original_ptr)
+      if line_idx is None:
+        original_ptr = len(original_transcript)
+        continue
+      original_ptr = line_idx
+      to_add_transcript = original_transcript[line_idx]
+      if to_add_transcript['text'] in matched_texts:
+        continue
+      to_add_transcript['index'] = line_idx
+      matched_result.append(to_add_transcript)
+      matched_texts.add(to_add_transcript['text'])
+      latest_added_scene = line_idx
+
+    return matched_result
+
   def _find_the_match(
       self,
       words: list,
@@ -12,8 +12,14 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import copy
+import random
 import unittest
+import languages
 from languages import DefaultLanguage
+from languages import Thai
+
+THAI_TEXTS = ["สวัสดี", "ครับ", "กล้อง", "ใหม่", "ดี", "มาก", "ค่ะ", ""]
 
 
 class DefaultLanguageTest(unittest.TestCase):
@@ -90,5 +96,44 @@ class DefaultLanguageTest(unittest.TestCase):
                         "words": transcript1[6:]
                       }])
 
+
+class ThaiTest(unittest.TestCase):
+
+  def make_transcript(self, rng: random.Random) -> list:
+    transcript = []
+    for line_idx in range(rng.randint(0, 12)):
+      texts = rng.choices(THAI_TEXTS, k=rng.randint(1, 4))
+      transcript.append({
+          "text": "".join(texts) if rng.random() < 0.7 else "ซ้ำ",
+          "startTime": line_idx,
+          "endTime": line_idx + 1,
+          "words": [{"text": text} for text in texts],
+      })
+    return transcript
+
+  def test_index_matches_scan(self):
+    rng = random.Random(20)
+    for _ in range(1000):
+      transcript = self.make_transcript(rng)
+      if not transcript:
+        # The scan indexes past an empty transcript.
+        continue
+      summary = " ".join(
+          "".join(rng.choices(THAI_TEXTS + ["ลา"], k=rng.randint(1, 3)))
+          for _ in range(rng.randint(1, 10))
+      )
+      scan_transcript = copy.deepcopy(transcript)
+      expected = Thai(languages.THAI_MATCH_SCAN).get_clips_from_transcript(
+          [], summary, scan_transcript)
+      actual = Thai(languages.THAI_MATCH_INDEX).get_clips_from_transcript(
+          [], summary, transcript)
+      self.assertEqual(actual, expected, (transcript, summary))
+      self.assertEqual(transcript, scan_transcript)
+
+  def test_unknown_match(self):
+    with self.assertRaises(ValueError):
+      Thai("fuzzy")
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -10,8 +10,11 @@
 # limitations under the License.
 """LLM Module to define LLM models, and generate prompts"""
 
+from model_registry import ModelRegistry
 from vertexai.preview.language_models import TextGenerationModel
 
+MODELS = ModelRegistry(TextGenerationModel.from_pretrained)
+
 
 def send_transcript_to_llm(text: str,
                            model: str = "text-bison@002",
@@ -37,7 +40,8 @@ def send_transcript_to_llm(text: str,
   # AdClip uses the default value for parameters
   # https://cloud.google.com/vertex-ai/docs/generative-ai/model-reference/text
   # The best performing model for AdClip is currently "text-unicorn@001"
-  model = TextGenerationModel.from_pretrained(model)
+  model = MODELS.get(model)
+  print(f'Model registry: {MODELS.get_stats()}')
   response = model.predict(text,
                            temperature=temperature,
                            max_output_tokens=max_output_tokens,
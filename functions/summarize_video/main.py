@@ -27,99 +27,96 @@ from firebase_admin import initialize_app, firestore
 from languages import Language
 from languages import DefaultLanguage
 from languages import Thai
+from languages import THAI_MATCH_INDEX
+from languages import THAI_MATCHES
+from shot_matching import calculate_duration
+from shot_matching import get_segments
+from shot_matching import match_with_video_shots
+from typing import Callable
+import alignment
+import duration_fitting
 import itertools
 import firestore
 import llm
+import os
+import sweep
 
 
 MAX_DURATION = float(40)
 MIN_DURATION = float(10)
 LANGUAGE_CODE = "en-US"
 MODEL_NAME = "text-unicorn@001"
+ALIGNMENT = os.environ.get("ALIGNMENT", alignment.ALIGNMENT_SCAN)
+THAI_MATCH = os.environ.get("THAI_MATCH", THAI_MATCH_INDEX)
+SWEEP_SERIAL = "serial"
+SWEEP_PARALLEL = "parallel"
+SWEEP = os.environ.get("SWEEP", SWEEP_SERIAL)
+SWEEP_TEMPERATURES = (0.2, 0.4, 0.6, 0.8)
+MAX_IN_FLIGHT = int(os.environ.get("MAX_IN_FLIGHT", 2))
+DURATION_LLM = "llm"
+DURATION_KNAPSACK = "knapsack"
+DURATION_STRATEGY = os.environ.get("DURATION_STRATEGY", DURATION_LLM)
 
 
 initialize_app()
 
 
-def calculate_duration(shortened_text: str,
-                       transcript_words: list,
-                       video_shots: list,
-                       input_transcript: list,
-                       language: Language) -> float:
-  """Returns the total duration of all of the clips.
+def shorten_serially(full_text: str,
+                     user_prompt: str,
+                     language_code: str,
+                     model_name: str,
+                     duration_bounds: tuple[float, float],
+                     get_duration: Callable[[str], float]) -> str:
+  """Shortens the transcript, shortening the output again until it fits.
 
-  This function evaluates if the shortened video fulfills the duration
-  requirements from the users.
+  Args:
+    full_text: The full transcript.
+    user_prompt: The prompt that users may input on the UI.
+    language_code: The language code of the transcript.
+    model_name: The Language Model to use.
+    duration_bounds: The minimum and maximum duration of the video.
+    get_duration: Returns the duration of the clips of a shortened text.
+
+  Returns:
+    The shortened text, or 'The response was blocked'.
   """
-  total_duration = 0
-  clips = language.get_clips_from_transcript(
-      transcript_words, shortened_text, input_transcript
+  min_duration, max_duration = duration_bounds
+  # 1st attempt to shorten transcript.
+  shortened_text = llm.send_transcript_to_llm(
+      text=llm.make_prompt(full_text, user_prompt, language_code=language_code),
+      model=model_name, temperature=0.2
   )
-  clips = match_with_video_shots(video_shots, clips, transcript_words)
-  print('\\\\\\\\\calculate/////////')
-  print(clips)
-  for clip in clips:
-    total_duration += clip.get('duration')
-  return total_duration
 
+  if shortened_text == 'The response was blocked':
+    return shortened_text
 
-def match_with_video_shots(video_shots: list,
-                           transcript: list,
-                           words: list) -> list:
-  """Adjusts the startTime and endTime of each line in the transcript.
-
-  This implementation helps with "jumpy" transition in the final output video.
+  print('----shortened_text-----')
+  print(shortened_text)
 
-  Args:
-    video_shots: The list containing video shots in format of
-    [{end_time, start_time}, {end_time, start_time},]
-    transcript: The full transcript transcribed by Speech to Text AI.
-    words: A list containing the startTime and eachTime of each word in the full
-    transcript.
+  duration = get_duration(shortened_text)
+  print('----duration-----')
+  print(duration)
 
-  Returns:
-    The transcript with the adjusted startTime and endTime.
-  """
-  shot_index = 0
-  word_index = 0
-  for index, line in enumerate(transcript):
-    while video_shots[shot_index]['end_time'] <= line['startTime']:
-      shot_index += 1
-    video_shot = video_shots[shot_index]
-
-    start_time = min(line['startTime'], video_shot['start_time'])
-    while (
-        word_index + 1 < len(words) - 1
-        and words[word_index + 1]['endTime'] < line['startTime']
-    ):
-      word_index += 1
-    previous_word = words[word_index]
-    if previous_word['startTime'] != line['startTime']:
-      start_time = max(previous_word['endTime'], start_time)
-
-    transcript[index]['startTime'] = start_time
-
-    while video_shots[shot_index]['end_time'] < line['endTime']:
-      shot_index += 1
-    video_shot = video_shots[shot_index]
-
-    end_time = max(line['endTime'], video_shot['end_time'])
-
-    while (
-        word_index < len(words) - 1
-        and words[word_index]['startTime'] < line['endTime']
-    ):
-      word_index += 1
-    next_word = words[word_index]
-    if next_word['endTime'] != line['endTime']:
-      end_time = min(end_time, next_word['startTime'])
-
-    if index == len(transcript) - 1:
-      end_time = video_shots[-1]['end_time']
-
-    transcript[index]['endTime'] = end_time
-    transcript[index]['duration'] = end_time - start_time
-  return transcript
+  # Validate duration and start a loop if duration condition is not met.
+  # Keep the loop for maximum 3 times.
+  temperature = 0.2
+  while temperature <= 0.6 and (
+      duration > max_duration or duration < min_duration
+  ):
+    temperature += 0.2
+    shortened_text = llm.send_transcript_to_llm(
+        text=llm.make_prompt(
+            shortened_text, user_prompt, language_code=language_code
+        ),
+        model=model_name,
+        temperature=temperature,
+    )
+    duration = get_duration(shortened_text)
+    print('----LOOP shortened_text-----')
+    print(shortened_text)
+    print('----duration-----')
+    print(duration)
+  return shortened_text
 
 
 @https_fn.on_call()
@@ -137,7 +134,12 @@ def summarize_transcript(request: https_fn.CallableRequest) -> any:
             "max_duration": 40,
             "min_duration": 10,
             "language_code": "en-US",
-            "model_name": "text-bison@002"
+            "model_name": "text-bison@002",
+            "alignment": "fuzzy",
+            "thai_match": "index",
+            "sweep": "parallel",
+            "max_in_flight": 2,
+            "duration_strategy": "knapsack"
         }
     }
 
@@ -150,6 +152,16 @@ def summarize_transcript(request: https_fn.CallableRequest) -> any:
   filename = request.data.get('filename')
   language_code = request.data.get('language_code') or LANGUAGE_CODE
   model_name = request.data.get('model_name') or MODEL_NAME
+  alignment_name = request.data.get('alignment') or ALIGNMENT
+  if alignment_name not in alignment.ALIGNMENTS:
+    print(f'Unknown alignment {alignment_name}, using {ALIGNMENT}')
+    alignment_name = ALIGNMENT
+  thai_match_name = request.data.get('thai_match') or THAI_MATCH
+  if thai_match_name not in THAI_MATCHES:
+    print(f'Unknown thai_match {thai_match_name}, using {THAI_MATCH}')
+    thai_match_name = THAI_MATCH
+  sweep_name = request.data.get('sweep') or SWEEP
+  duration_strategy = request.data.get('duration_strategy') or DURATION_STRATEGY
 
   try:
     max_duration = float(request.data.get('max_duration'))
@@ -159,11 +171,15 @@ def summarize_transcript(request: https_fn.CallableRequest) -> any:
     min_duration = float(request.data.get('min_duration'))
   except:
     min_duration = MIN_DURATION
+  try:
+    max_in_flight = int(request.data.get('max_in_flight'))
+  except:
+    max_in_flight = MAX_IN_FLIGHT
 
   if language_code == 'th-TH':
-    language = Thai()
+    language = Thai(thai_match_name)
   else:
-    language = DefaultLanguage()
+    language = DefaultLanguage(alignment_name)
 
   list_of_words = list(map(lambda line: line['words'], input_transcript))
   transcript_words = list(itertools.chain.from_iterable(list_of_words))
@@ -175,59 +191,65 @@ def summarize_transcript(request: https_fn.CallableRequest) -> any:
   print('----full_text-----')
   print(full_text)
 
-  # 1st attempt to shorten transcript.
-  shortened_text = llm.send_transcript_to_llm(
-      text=llm.make_prompt(full_text, user_prompt, language_code=language_code),
-      model=model_name, temperature=0.2
-  )
+  # Clips by summary words, shared by the duration checks and the result.
+  memo = {}
 
-  if shortened_text == 'The response was blocked':
-    return ValueError(
-        'The response was blocked due to potential violation of Responsible AI'
+  def get_duration(shortened_text: str) -> float:
+    return calculate_duration(
+        shortened_text, transcript_words, video_shots, input_transcript,
+        language, memo
     )
 
-  print('----shortened_text-----')
-  print(shortened_text)
-
-  duration = calculate_duration(
-      shortened_text, transcript_words, video_shots, input_transcript, language
-  )
-  print('----duration-----')
-  print(duration)
-
-  # Validate duration and start a loop if duration condition is not met.
-  # Keep the loop for maximum 3 times.
-  temperature = 0.2
-  while temperature <= 0.6 and (
-      duration > max_duration or duration < min_duration
-  ):
-    temperature += 0.2
+  if duration_strategy == DURATION_KNAPSACK:
+    # The clips are fitted to the duration below, so one call is enough.
     shortened_text = llm.send_transcript_to_llm(
         text=llm.make_prompt(
-            shortened_text, user_prompt, language_code=language_code
+            full_text, user_prompt, language_code=language_code
         ),
-        model=model_name,
-        temperature=temperature,
+        model=model_name, temperature=0.2
     )
-    duration = calculate_duration(
-        shortened_text,
-        transcript_words,
-        video_shots,
-        input_transcript,
-        language,
+  elif sweep_name == SWEEP_PARALLEL:
+    shortened_text = sweep.shorten_in_parallel(
+        full_text, SWEEP_TEMPERATURES, max_in_flight,
+        (min_duration, max_duration),
+        lambda text, temperature: llm.send_transcript_to_llm(
+            text=llm.make_prompt(
+                text, user_prompt, language_code=language_code
+            ),
+            model=model_name, temperature=temperature
+        ),
+        get_duration
+    )
+  else:
+    shortened_text = shorten_serially(
+        full_text, user_prompt, language_code, model_name,
+        (min_duration, max_duration), get_duration
     )
-    print('----LOOP shortened_text-----')
-    print(shortened_text)
-    print('----duration-----')
-    print(duration)
 
-  segments = language.get_clips_from_transcript(
-      transcript_words, shortened_text, input_transcript
+  if shortened_text == 'The response was blocked':
+    return ValueError(
+        'The response was blocked due to potential violation of Responsible AI'
+    )
+
+  clips, segments = get_segments(
+      shortened_text, transcript_words, video_shots, input_transcript,
+      language, memo
   )
   print('----segments-----')
-  print(segments)
+  print(clips)
+
+  if duration_strategy == DURATION_KNAPSACK:
+    clips = duration_fitting.fit_clips(
+        clips, input_transcript, (min_duration, max_duration),
+        lambda candidates: match_with_video_shots(
+            video_shots, candidates, transcript_words
+        ),
+        extends_last=True,
+    )
+    print('----fitted segments-----')
+    print(clips)
+    segments = match_with_video_shots(video_shots, clips, transcript_words)
 
-  segments = match_with_video_shots(video_shots, segments, transcript_words)
   print('----segments + video shots-----')
   print(segments)
 
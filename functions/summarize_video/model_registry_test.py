@@ -0,0 +1,62 @@
+# Copyright 2023 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from concurrent import futures
+import threading
+import time
+import unittest
+from model_registry import ModelRegistry
+
+
+class ModelRegistryTest(unittest.TestCase):
+
+  def test_loads_each_model_once(self):
+    loaded = []
+
+    def load(model_name: str) -> dict:
+      loaded.append(model_name)
+      return {"name": model_name}
+
+    models = ModelRegistry(load)
+    first = models.get("text-bison@002")
+    self.assertIs(models.get("text-bison@002"), first)
+    self.assertEqual(
+        models.get("text-unicorn@001"), {"name": "text-unicorn@001"})
+    self.assertEqual(loaded, ["text-bison@002", "text-unicorn@001"])
+    stats = models.get_stats()
+    self.assertEqual(stats["loads"], 2)
+    self.assertEqual(stats["hits"], 1)
+
+  def test_concurrent_first_calls_share_one_load(self):
+    loaded = []
+    lock = threading.Lock()
+
+    def load(model_name: str) -> object:
+      time.sleep(0.05)
+      with lock:
+        loaded.append(model_name)
+      return object()
+
+    models = ModelRegistry(load)
+    with futures.ThreadPoolExecutor(max_workers=8) as executor:
+      handles = list(executor.map(models.get, ["text-bison@002"] * 8))
+    self.assertEqual(loaded, ["text-bison@002"])
+    self.assertTrue(all(handle is handles[0] for handle in handles))
+    stats = models.get_stats()
+    self.assertEqual(stats["hits"], 7)
+    self.assertGreater(stats["saved_seconds"], stats["load_seconds"])
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,98 @@
+# Copyright 2023 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Interval index over the video shots for snapping timestamps.
+
+The shots from video_intelligence.process_video are consecutive, so their
+start and end times are both sorted. ShotIndex keeps them in two sorted
+lists and answers every lookup with a binary search. The find methods take
+the same lo bound as bisect, so a pointer that is passed back in as lo
+moves exactly like a hand-written `while shots[i][...] < t: i += 1` loop,
+without walking the shots one by one.
+
+Timestamps past the last shot never raise: when the index is given the end
+of the media, the time after the last shot counts as one more shot, and
+get clamps every index to the last shot.
+
+The same module is deployed with transcribe_video, summarize_video and
+summarize_video_by_topics; keep the copies in sync.
+"""
+import bisect
+
+
+class ShotIndex:
+  """Sorted start and end times of the video shots.
+
+  Attributes:
+    shots: The shots, including the shot after the last detected one when
+      end_time is past it.
+    start_times: The start time of every shot.
+    end_times: The end time of every shot.
+  """
+
+  def __init__(self, video_shots: list, end_time: float | None = None):
+    """Indexes the shots.
+
+    Args:
+      video_shots: The consecutive shots as [{start_time, end_time}, ...].
+      end_time: The end of the media. If it is past the last shot, the time
+        in between is added as a last shot.
+    """
+    self.shots = list(video_shots or [])
+    last_end_time = self.shots[-1]['end_time'] if self.shots else 0
+    if end_time is not None and end_time > last_end_time:
+      self.shots.append({'start_time': last_end_time, 'end_time': end_time})
+    self.start_times = [shot['start_time'] for shot in self.shots]
+    self.end_times = [shot['end_time'] for shot in self.shots]
+    self._boundaries = sorted(set(self.start_times + self.end_times))
+
+  def __len__(self) -> int:
+    return len(self.shots)
+
+  def get(self, shot_index: int) -> dict:
+    """Returns the shot, the last shot for any index past it."""
+    return self.shots[min(shot_index, len(self.shots) - 1)]
+
+  def find_ending_after(self, time: float, lo: int = 0) -> int:
+    """Returns the first shot from lo that ends after time, or len(self)."""
+    return bisect.bisect_right(self.end_times, time, lo)
+
+  def find_ending_at_or_after(self, time: float, lo: int = 0) -> int:
+    """Returns the first shot from lo that ends at or after time."""
+    return bisect.bisect_left(self.end_times, time, lo)
+
+  def find_starting_at_or_after(self, time: float, lo: int = 0) -> int:
+    """Returns the first shot from lo that starts at or after time."""
+    return bisect.bisect_left(self.start_times, time, lo)
+
+  def find_containing(self, time: float) -> int:
+    """Returns the shot with start_time <= time < end_time.
+
+    Times before the first shot map to the first shot, and times past the
+    last shot to the last one.
+    """
+    return min(self.find_ending_after(time), len(self.shots) - 1)
+
+  def next_boundary(self, time: float) -> float | None:
+    """Returns the first shot start or end after time, if any."""
+    index = bisect.bisect_right(self._boundaries, time)
+    if index == len(self._boundaries):
+      return None
+    return self._boundaries[index]
+
+  def previous_boundary(self, time: float) -> float | None:
+    """Returns the last shot start or end before time, if any."""
+    index = bisect.bisect_left(self._boundaries, time)
+    if index == 0:
+      return None
+    return self._boundaries[index - 1]
@@ -0,0 +1,135 @@
+# Copyright 2023 Google LLC
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     https://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import random
+import unittest
+from shot_index import ShotIndex
+
+EXAMPLES = 300
+
+
+def make_video_shots(rng: random.Random) -> list:
+  """Makes consecutive shots like video_intelligence.process_video."""
+  video_shots = []
+  time = 0
+  for _ in range(rng.randint(1, 20)):
+    end_time = round(time + rng.choice([0.1, 0.4, 1, 2.5, 6]), 1)
+    video_shots.append({"start_time": time, "end_time": end_time})
+    time = round(end_time + rng.choice([0, 0, 0.1]), 1)
+  return video_shots
+
+
+def make_times(rng: random.Random, video_shots: list) -> list:
+  """Makes query times inside, on the boundaries of and around the shots."""
+  last_end_time = video_shots[-1]["end_time"]
+  boundaries = [shot["start_time"] for shot in video_shots] + [
+      shot["end_time"] for shot in video_shots
+  ]
+  return [
+      rng.choice([
+          rng.choice(boundaries),
+          round(rng.uniform(-1, last_end_time + 1), 2),
+      ])
+      for _ in range(rng.randint(1, 15))
+  ]
+
+
+def walk(video_shots: list, key: str, time: float, shot_index: int,
+         inclusive: bool) -> int:
+  """The linear pointer walk ShotIndex replaces, bounded by the shot count."""
+  while shot_index < len(video_shots) and (
+      video_shots[shot_index][key] <= time if inclusive
+      else video_shots[shot_index][key] < time):
+    shot_index += 1
+  return shot_index
+
+
+class ShotIndexTest(unittest.TestCase):
+
+  def test_find_matches_pointer_walk(self):
+    rng = random.Random(17)
+    for _ in range(EXAMPLES):
+      video_shots = make_video_shots(rng)
+      shots = ShotIndex(video_shots)
+      pointers = {"after": 0, "at_or_after": 0, "start": 0}
+      for time in make_times(rng, video_shots):
+        expected = {
+            "after": walk(
+                video_shots, "end_time", time, pointers["after"], True),
+            "at_or_after": walk(
+                video_shots, "end_time", time, pointers["at_or_after"], False),
+            "start": walk(
+                video_shots, "start_time", time, pointers["start"], False),
+        }
+        pointers = {
+            "after": shots.find_ending_after(time, pointers["after"]),
+            "at_or_after": shots.find_ending_at_or_after(
+                time, pointers["at_or_after"]),
+            "start": shots.find_starting_at_or_after(time, pointers["start"]),
+        }
+        self.assertEqual(pointers, expected)
+
+  def test_find_containing(self):
+    rng = random.Random(18)
+    for _ in range(EXAMPLES):
+      video_shots = make_video_shots(rng)
+      shots = ShotIndex(video_shots)
+      for time in make_times(rng, video_shots):
+        shot_index = shots.find_containing(time)
+        if time < video_shots[-1]["end_time"]:
+          # The first shot that has not ended yet, which contains the time
+          # unless it falls into a gap between shots.
+          self.assertGreater(video_shots[shot_index]["end_time"], time)
+          for shot in video_shots[:shot_index]:
+            self.assertLessEqual(shot["end_time"], time)
+        else:
+          self.assertEqual(shot_index, len(video_shots) - 1)
+
+  def test_boundaries(self):
+    rng = random.Random(19)
+    for _ in range(EXAMPLES):
+      video_shots = make_video_shots(rng)
+      shots = ShotIndex(video_shots)
+      boundaries = {shot["start_time"] for shot in video_shots} | {
+          shot["end_time"] for shot in video_shots
+      }
+      for time in make_times(rng, video_shots):
+        after = [boundary for boundary in boundaries if boundary > time]
+        before = [boundary for boundary in boundaries if boundary < time]
+        self.assertEqual(shots.next_boundary(time), min(after, default=None))
+        self.assertEqual(
+            shots.previous_boundary(time), max(before, default=None))
+
+  def test_times_past_the_last_shot(self):
+    rng = random.Random(20)
+    for _ in range(EXAMPLES):
+      video_shots = make_video_shots(rng)
+      last_end_time = video_shots[-1]["end_time"]
+      shots = ShotIndex(video_shots, last_end_time + 3)
+      self.assertEqual(len(shots), len(video_shots) + 1)
+      self.assertEqual(
+          shots.get(len(shots) + 5),
+          {"start_time": last_end_time, "end_time": last_end_time + 3},
+      )
+      shot_index = shots.find_ending_after(last_end_time + 1)
+      self.assertEqual(shots.get(shot_index)["start_time"], last_end_time)
+
+  def test_end_time_within_shots_adds_no_shot(self):
+    video_shots = [{"start_time": 0, "end_time": 2}]
+    self.assertEqual(len(ShotIndex(video_shots, 1)), 1)
+    self.assertEqual(len(ShotIndex(None)), 0)
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,150 @@
+# Copyright 2023 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Matches the clips of a shortened transcript with the video shots.
+
+get_segments memoizes the clips of every shortened text for the request,
+so the duration checks of summarize_transcript and its final result align
+each distinct text only once. match_with_video_shots returns new lines, so
+the memoized clips are never changed.
+"""
+from languages import Language
+from shot_index import ShotIndex
+
+
+def get_segments(shortened_text: str,
+                 transcript_words: list,
+                 video_shots: list,
+                 input_transcript: list,
+                 language: Language,
+                 memo: dict | None = None) -> tuple[list, list]:
+  """Returns the clips of the shortened text, before and after the shots.
+
+  The clips only depend on the words of the shortened text, so a memo that
+  lives as long as the request returns the same clips for every text with
+  the same words. The returned lists are shared with the memo and must not
+  be changed.
+
+  Args:
+    shortened_text: The shortened transcript from the LLM.
+    transcript_words: The words of the full transcript.
+    video_shots: The video shots of the video.
+    input_transcript: The full transcript.
+    language: The language of the transcript.
+    memo: The clips computed earlier in the request, by summary words.
+
+  Returns:
+    The clips from get_clips_from_transcript, and the same clips after
+    match_with_video_shots.
+  """
+  key = language.normalize_summary(shortened_text)
+  if memo is not None and key in memo:
+    return memo[key]
+  clips = language.get_clips_from_transcript(
+      transcript_words, shortened_text, input_transcript
+  )
+  segments = (
+      clips, match_with_video_shots(video_shots, clips, transcript_words)
+  )
+  if memo is not None:
+    memo[key] = segments
+  return segments
+
+
+def calculate_duration(shortened_text: str,
+                       transcript_words: list,
+                       video_shots: list,
+                       input_transcript: list,
+                       language: Language,
+                       memo: dict | None = None) -> float:
+  """Returns the total duration of all of the clips.
+
+  This function evaluates if the shortened video fulfills the duration
+  requirements from the users.
+  """
+  total_duration = 0
+  _, clips = get_segments(
+      shortened_text, transcript_words, video_shots, input_transcript,
+      language, memo
+  )
+  print('\\\\\\\\\calculate/////////')
+  print(clips)
+  for clip in clips:
+    total_duration += clip.get('duration')
+  return total_duration
+
+
+def match_with_video_shots(video_shots: list,
+                           transcript: list,
+                           words: list) -> list:
+  """Adjusts the startTime and endTime of each line in the transcript.
+
+  This implementation helps with "jumpy" transition in the final output video.
+
+  Args:
+    video_shots: The list containing video shots in format of
+    [{end_time, start_time}, {end_time, start_time},]
+    transcript: The full transcript transcribed by Speech to Text AI.
+    words: A list containing the startTime and eachTime of each word in the full
+    transcript.
+
+  Returns:
+    A copy of the transcript with the adjusted startTime and endTime. The
+    transcript itself is not changed.
+  """
+  # Lines past the last shot snap to the end of the transcript.
+  end_times = [line['endTime'] for line in transcript] + [
+      word['endTime'] for word in words[-1:]
+  ]
+  shots = ShotIndex(video_shots, max(end_times, default=None))
+  shot_index = 0
+  word_index = 0
+  adjusted_transcript = []
+  for index, line in enumerate(transcript):
+    shot_index = shots.find_ending_after(line['startTime'], shot_index)
+    video_shot = shots.get(shot_index)
+
+    start_time = min(line['startTime'], video_shot['start_time'])
+    while (
+        word_index + 1 < len(words) - 1
+        and words[word_index + 1]['endTime'] < line['startTime']
+    ):
+      word_index += 1
+    previous_word = words[word_index]
+    if previous_word['startTime'] != line['startTime']:
+      start_time = max(previous_word['endTime'], start_time)
+
+    adjusted_line = dict(line)
+    adjusted_line['startTime'] = start_time
+
+    shot_index = shots.find_ending_at_or_after(line['endTime'], shot_index)
+    video_shot = shots.get(shot_index)
+
+    end_time = max(line['endTime'], video_shot['end_time'])
+
+    while (
+        word_index < len(words) - 1
+        and words[word_index]['startTime'] < line['endTime']
+    ):
+      word_index += 1
+    next_word = words[word_index]
+    if next_word['endTime'] != line['endTime']:
+      end_time = min(end_time, next_word['startTime'])
+
+    if index == len(transcript) - 1:
+      end_time = shots.get(len(shots) - 1)['end_time']
+
+    adjusted_line['endTime'] = end_time
+    adjusted_line['duration'] = end_time - start_time
+    adjusted_transcript.append(adjusted_line)
+  return adjusted_transcript
@@ -0,0 +1,111 @@
+# Copyright 2023 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import copy
+import unittest
+from languages import DefaultLanguage
+import shot_matching
+
+TEXTS = "we launch the new pixel today with the best camera ever".split(" ")
+
+
+def make_transcript() -> list:
+  """Makes a line per three words, one word per second."""
+  words = [
+      {"text": text, "startTime": index, "endTime": index + 0.8}
+      for index, text in enumerate(TEXTS)
+  ]
+  transcript = []
+  for start in range(0, len(words), 3):
+    line_words = words[start:start + 3]
+    transcript.append({
+        "text": " ".join(word["text"] for word in line_words),
+        "startTime": line_words[0]["startTime"],
+        "endTime": line_words[-1]["endTime"],
+        "duration": line_words[-1]["endTime"] - line_words[0]["startTime"],
+        "words": line_words,
+    })
+  return transcript
+
+
+VIDEO_SHOTS = [
+    {"start_time": 0, "end_time": 2.5},
+    {"start_time": 2.5, "end_time": 7.2},
+    {"start_time": 7.2, "end_time": 11},
+]
+
+
+class CountingLanguage(DefaultLanguage):
+  """Counts the alignments, by the shortened text that was aligned."""
+
+  def __init__(self):
+    super().__init__()
+    self.aligned = []
+
+  def get_clips_from_transcript(
+      self,
+      transcript_words: list,
+      shortened_text: str,
+      input_transcript: list) -> list:
+    self.aligned.append(shortened_text)
+    return super().get_clips_from_transcript(
+        transcript_words, shortened_text, input_transcript
+    )
+
+
+class ShotMatchingTest(unittest.TestCase):
+
+  def setUp(self):
+    self.transcript = make_transcript()
+    self.words = [word for line in self.transcript for word in line["words"]]
+
+  def test_match_with_video_shots_keeps_the_lines(self):
+    expected = copy.deepcopy(self.transcript)
+    adjusted = shot_matching.match_with_video_shots(
+        VIDEO_SHOTS, self.transcript, self.words
+    )
+    self.assertEqual(self.transcript, expected)
+    self.assertEqual(len(adjusted), len(self.transcript))
+    for adjusted_line, line in zip(adjusted, self.transcript):
+      self.assertIsNot(adjusted_line, line)
+    self.assertEqual(adjusted[-1]["endTime"], VIDEO_SHOTS[-1]["end_time"])
+
+  def test_aligns_each_normalized_text_once(self):
+    language = CountingLanguage()
+    memo = {}
+    texts = [
+        "The new Pixel today.",
+        "the new pixel, today",
+        "Transcript: the new Pixel today!",
+        "The best camera ever.",
+    ]
+    durations = [
+        shot_matching.calculate_duration(
+            text, self.words, VIDEO_SHOTS, self.transcript, language, memo
+        )
+        for text in texts * 3
+    ]
+    clips, segments = shot_matching.get_segments(
+        texts[1], self.words, VIDEO_SHOTS, self.transcript, language, memo
+    )
+    self.assertEqual(language.aligned, [texts[0], texts[3]])
+    self.assertEqual(durations[:3], [durations[0]] * 3)
+    self.assertEqual(
+        sum(segment["duration"] for segment in segments), durations[0]
+    )
+    self.assertEqual(clips[0]["text"], "the new pixel today")
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,99 @@
+# Copyright 2023 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Parallel temperature sweep for shortening a transcript with the LLM.
+
+The serial loop of summarize_transcript waits for every LLM call before it
+decides whether to make the next one. The sweep shortens the full
+transcript at every temperature at the same time instead, and scores each
+candidate as soon as it arrives:
+
+  - The first candidate within the duration bounds is returned at once.
+  - A candidate that is too long and the closest to the bounds so far is
+    shortened again, at the same temperature, like the serial loop does.
+    At most one follow-up is sent per temperature, so the sweep makes at
+    most twice as many calls as there are temperatures.
+  - Blocked candidates are skipped.
+  - When no candidate fits, the one closest to the bounds is returned.
+
+The LLM call and the duration of a candidate are passed in, so the sweep
+does not depend on Vertex AI or on the alignment.
+"""
+from concurrent import futures
+from typing import Callable
+
+BLOCKED_RESPONSE = 'The response was blocked'
+
+
+def get_duration_miss(duration: float,
+                      duration_bounds: tuple[float, float]) -> float:
+  """Returns how many seconds the duration is outside of the bounds."""
+  min_duration, max_duration = duration_bounds
+  return max(min_duration - duration, duration - max_duration, 0)
+
+
+def shorten_in_parallel(full_text: str,
+                        temperatures: tuple,
+                        max_in_flight: int,
+                        duration_bounds: tuple[float, float],
+                        shorten: Callable[[str, float], str],
+                        get_duration: Callable[[str], float]) -> str:
+  """Shortens the transcript at all temperatures at the same time.
+
+  Args:
+    full_text: The full transcript.
+    temperatures: The temperatures to shorten the transcript at.
+    max_in_flight: The maximum number of concurrent LLM calls.
+    duration_bounds: The minimum and maximum duration of the video.
+    shorten: Sends a text and a temperature to the LLM and returns the
+      shortened text, or BLOCKED_RESPONSE.
+    get_duration: Returns the duration of the clips of a shortened text.
+
+  Returns:
+    The shortened text, or BLOCKED_RESPONSE if every candidate was blocked.
+  """
+  max_in_flight = max(1, max_in_flight)
+  queue = [(full_text, temperature) for temperature in temperatures]
+  reshortened = set()
+  best_text = BLOCKED_RESPONSE
+  best_miss = None
+  executor = futures.ThreadPoolExecutor(max_workers=max_in_flight)
+  try:
+    pending = {}
+    while queue or pending:
+      while queue and len(pending) < max_in_flight:
+        text, temperature = queue.pop(0)
+        pending[executor.submit(shorten, text, temperature)] = temperature
+      done, _ = futures.wait(pending, return_when=futures.FIRST_COMPLETED)
+      for future in done:
+        temperature = pending.pop(future)
+        shortened_text = future.result()
+        if shortened_text == BLOCKED_RESPONSE:
+          continue
+        duration = get_duration(shortened_text)
+        print('----SWEEP shortened_text-----')
+        print(shortened_text)
+        print('----duration-----')
+        print(duration)
+        miss = get_duration_miss(duration, duration_bounds)
+        if miss == 0:
+          return shortened_text
+        if best_miss is not None and miss >= best_miss:
+          continue
+        best_text, best_miss = shortened_text, miss
+        if duration > duration_bounds[1] and temperature not in reshortened:
+          reshortened.add(temperature)
+          queue.append((shortened_text, temperature))
+    return best_text
+  finally:
+    executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,144 @@
+# Copyright 2023 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+import time
+import unittest
+import sweep
+
+TEMPERATURES = (0.2, 0.4, 0.6, 0.8)
+BOUNDS = (10, 20)
+
+
+class FakeLlm:
+  """Stands in for llm.send_transcript_to_llm with scripted responses.
+
+  Every response is keyed by the shortened text and the temperature, and
+  its duration is the number after the last "/" of the response.
+  """
+
+  def __init__(self, responses: dict, delays: dict | None = None):
+    self.responses = responses
+    self.delays = delays or {}
+    self.calls = []
+    self.in_flight = 0
+    self.max_in_flight = 0
+    self._lock = threading.Lock()
+
+  def shorten(self, text: str, temperature: float) -> str:
+    with self._lock:
+      self.calls.append((text, temperature))
+      self.in_flight += 1
+      self.max_in_flight = max(self.max_in_flight, self.in_flight)
+    time.sleep(self.delays.get((text, temperature), 0.01))
+    with self._lock:
+      self.in_flight -= 1
+    return self.responses[(text, temperature)]
+
+  def run(self, max_in_flight: int = 2) -> str:
+    return sweep.shorten_in_parallel(
+        "full", TEMPERATURES, max_in_flight, BOUNDS, self.shorten,
+        lambda text: float(text.rsplit("/", 1)[-1]),
+    )
+
+
+class ShortenInParallelTest(unittest.TestCase):
+
+  def test_returns_the_first_fit(self):
+    fake = FakeLlm({
+        ("full", 0.2): "a/15",
+        ("full", 0.4): "b/12",
+        ("full", 0.6): "c/30",
+        ("full", 0.8): "d/18",
+    })
+    self.assertEqual(fake.run(max_in_flight=1), "a/15")
+    self.assertEqual(fake.calls, [("full", 0.2)])
+
+  def test_does_not_wait_for_slow_candidates(self):
+    fake = FakeLlm(
+        {
+            ("full", 0.2): "a/15",
+            ("full", 0.4): "b/12",
+            ("full", 0.6): "c/14",
+            ("full", 0.8): "d/18",
+        },
+        delays={("full", 0.2): 1},
+    )
+    start = time.perf_counter()
+    self.assertEqual(fake.run(), "b/12")
+    self.assertLess(time.perf_counter() - start, 0.5)
+
+  def test_falls_back_to_the_closest_candidate(self):
+    fake = FakeLlm({
+        ("full", 0.2): "a/5",
+        ("full", 0.4): "b/8",
+        ("full", 0.6): "c/3",
+        ("full", 0.8): "d/1",
+    })
+    self.assertEqual(fake.run(), "b/8")
+    self.assertEqual(len(fake.calls), len(TEMPERATURES))
+
+  def test_shortens_the_best_long_candidate_again(self):
+    fake = FakeLlm({
+        ("full", 0.2): "a/40",
+        ("full", 0.4): "b/60",
+        ("full", 0.6): "c/70",
+        ("full", 0.8): "d/80",
+        ("a/40", 0.2): "e/16",
+    })
+    self.assertEqual(fake.run(max_in_flight=1), "e/16")
+    self.assertIn(("a/40", 0.2), fake.calls)
+    self.assertNotIn(("b/60", 0.4), fake.calls)
+
+  def test_shortens_each_temperature_again_at_most_once(self):
+    fake = FakeLlm({
+        ("full", 0.2): "a/40",
+        ("full", 0.4): "b/60",
+        ("full", 0.6): "c/70",
+        ("full", 0.8): "d/80",
+        ("a/40", 0.2): "e/30",
+        ("e/30", 0.2): "f/15",
+    })
+    self.assertEqual(fake.run(max_in_flight=1), "e/30")
+    self.assertNotIn(("e/30", 0.2), fake.calls)
+
+  def test_skips_blocked_candidates(self):
+    fake = FakeLlm({
+        ("full", 0.2): sweep.BLOCKED_RESPONSE,
+        ("full", 0.4): "b/5",
+        ("full", 0.6): sweep.BLOCKED_RESPONSE,
+        ("full", 0.8): sweep.BLOCKED_RESPONSE,
+    })
+    self.assertEqual(fake.run(), "b/5")
+
+  def test_all_blocked(self):
+    fake = FakeLlm({
+        ("full", temperature): sweep.BLOCKED_RESPONSE
+        for temperature in TEMPERATURES
+    })
+    self.assertEqual(fake.run(), sweep.BLOCKED_RESPONSE)
+
+  def test_caps_the_calls_in_flight(self):
+    for max_in_flight in (1, 2, 3):
+      fake = FakeLlm(
+          {("full", temperature): "a/1" for temperature in TEMPERATURES},
+          delays={("full", temperature): 0.05 for temperature in TEMPERATURES},
+      )
+      fake.run(max_in_flight)
+      self.assertEqual(len(fake.calls), len(TEMPERATURES))
+      self.assertEqual(fake.max_in_flight, max_in_flight)
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,202 @@
+# Copyright 2023 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Columnar representation of a transcript for line_finder.
+
+A transcript travels between the functions as a list of line dicts, each
+with a list of word dicts. CompactTranscript keeps the same data in flat
+columns instead: the word times in array('d') columns, the word texts as
+ids into a table of interned strings, and the lines as offsets into the
+word columns. Scans over 10k+ words then touch a few contiguous arrays
+instead of a dict per word, and words can be compared by id.
+
+The conversion to and from the JSON shape is lossless: keys that are not
+columns (e.g. shouldKeep) and non-numeric values are kept per word and per
+line, and missing keys stay missing. Numbers come back as floats, which
+compare equal to the original ints.
+"""
+from array import array
+import math
+
+WORD_TIME_KEYS = ('startTime', 'endTime', 'duration', 'gap')
+LINE_TIME_KEYS = ('startTime', 'endTime', 'duration')
+_MISSING = math.nan
+
+
+def _is_number(value) -> bool:
+  return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _split_columns(item: dict, column_keys: tuple, skip_keys: tuple) -> tuple:
+  """Splits a dict into its column values and the remaining extras."""
+  values = []
+  extras = {}
+  for key in column_keys:
+    value = item.get(key, _MISSING)
+    if _is_number(value):
+      values.append(float(value))
+    else:
+      values.append(_MISSING)
+      if key in item:
+        extras[key] = value
+  for key, value in item.items():
+    if key not in column_keys and key not in skip_keys:
+      extras[key] = value
+  return values, extras
+
+
+class CompactTranscript:
+  """A transcript stored as columns.
+
+  Attributes:
+    texts: The interned word texts, indexed by the text ids.
+    text_ids: The text id of every word.
+    word_columns: An array('d') per key of WORD_TIME_KEYS, NaN where the
+      word has no value for the key.
+    line_offsets: The index of the first word of every line followed by the
+      word count, so the words of line i are line_offsets[i]:[i + 1].
+    line_texts: The text of every line.
+    line_columns: An array('d') per key of LINE_TIME_KEYS.
+  """
+
+  def __init__(self):
+    self.texts = []
+    self._text_ids = {}
+    self.text_ids = array('q')
+    self.word_columns = {key: array('d') for key in WORD_TIME_KEYS}
+    self._word_extras = {}
+    self.line_offsets = array('q', [0])
+    self.line_texts = []
+    self.line_columns = {key: array('d') for key in LINE_TIME_KEYS}
+    self._line_extras = {}
+    self._lines_without_words = set()
+
+  @classmethod
+  def from_json(cls, transcript: list) -> 'CompactTranscript':
+    """Builds the columns from a list of lines with their words."""
+    compact = cls()
+    for line in transcript:
+      compact.append_line(line)
+    return compact
+
+  @classmethod
+  def from_words(cls, words: list) -> 'CompactTranscript':
+    """Builds the columns from a flat list of words as a single line."""
+    compact = cls()
+    for word in words:
+      compact.append_word(word)
+    compact.line_offsets.append(len(compact.text_ids))
+    compact.line_texts.append(None)
+    for key in LINE_TIME_KEYS:
+      compact.line_columns[key].append(_MISSING)
+    return compact
+
+  def intern(self, text: str) -> int:
+    """Returns the id of the text, adding it to the table if it is new."""
+    text_id = self._text_ids.get(text)
+    if text_id is None:
+      text_id = len(self.texts)
+      self._text_ids[text] = text_id
+      self.texts.append(text)
+    return text_id
+
+  def get_text_id(self, text: str) -> int:
+    """Returns the id of the text, or -1 if no word has this text."""
+    return self._text_ids.get(text, -1)
+
+  def append_word(self, word: dict) -> None:
+    index = len(self.text_ids)
+    self.text_ids.append(self.intern(word['text']))
+    values, extras = _split_columns(word, WORD_TIME_KEYS, ('text',))
+    for key, value in zip(WORD_TIME_KEYS, values):
+      self.word_columns[key].append(value)
+    if extras:
+      self._word_extras[index] = extras
+
+  def append_line(self, line: dict) -> None:
+    index = len(self.line_texts)
+    for word in line.get('words', []):
+      self.append_word(word)
+    self.line_offsets.append(len(self.text_ids))
+    text = line.get('text')
+    self.line_texts.append(text if isinstance(text, str) else None)
+    values, extras = _split_columns(line, LINE_TIME_KEYS, ('text', 'words'))
+    if 'text' in line and not isinstance(text, str):
+      extras['text'] = text
+    for key, value in zip(LINE_TIME_KEYS, values):
+      self.line_columns[key].append(value)
+    if 'words' not in line:
+      self._lines_without_words.add(index)
+    if extras:
+      self._line_extras[index] = extras
+
+  @property
+  def word_count(self) -> int:
+    return len(self.text_ids)
+
+  @property
+  def line_count(self) -> int:
+    return len(self.line_texts)
+
+  @property
+  def start_times(self) -> array:
+    return self.word_columns['startTime']
+
+  @property
+  def end_times(self) -> array:
+    return self.word_columns['endTime']
+
+  @property
+  def gaps(self) -> array:
+    return self.word_columns['gap']
+
+  def get_text(self, word_index: int) -> str:
+    return self.texts[self.text_ids[word_index]]
+
+  def get_line_words(self, line_index: int) -> range:
+    """Returns the word indexes of a line."""
+    return range(
+        self.line_offsets[line_index], self.line_offsets[line_index + 1]
+    )
+
+  def word_to_json(self, word_index: int) -> dict:
+    word = {'text': self.get_text(word_index)}
+    for key in WORD_TIME_KEYS:
+      value = self.word_columns[key][word_index]
+      if not math.isnan(value):
+        word[key] = value
+    word.update(self._word_extras.get(word_index, {}))
+    return word
+
+  def words_to_json(self, start: int = 0, stop: int | None = None) -> list:
+    """Converts the words in [start, stop) back to word dicts."""
+    stop = self.word_count if stop is None else stop
+    return [self.word_to_json(index) for index in range(start, stop)]
+
+  def line_to_json(self, line_index: int) -> dict:
+    line = {}
+    if self.line_texts[line_index] is not None:
+      line['text'] = self.line_texts[line_index]
+    for key in LINE_TIME_KEYS:
+      value = self.line_columns[key][line_index]
+      if not math.isnan(value):
+        line[key] = value
+    if line_index not in self._lines_without_words:
+      words = self.get_line_words(line_index)
+      line['words'] = self.words_to_json(words.start, words.stop)
+    line.update(self._line_extras.get(line_index, {}))
+    return line
+
+  def to_json(self) -> list:
+    """Converts the transcript back to the list of line dicts."""
+    return [self.line_to_json(index) for index in range(self.line_count)]
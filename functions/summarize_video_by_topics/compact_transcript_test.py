@@ -0,0 +1,98 @@
+# Copyright 2023 Google LLC
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     https://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+from compact_transcript import CompactTranscript
+
+
+class CompactTranscriptTest(unittest.TestCase):
+
+  def setUp(self):
+    self.transcript = [
+      {
+        "text": "lorem ipsum",
+        "startTime": 0,
+        "endTime": 1.5,
+        "duration": 1.5,
+        "words": [
+          {
+            "text": "lorem",
+            "startTime": 0,
+            "endTime": 0.7,
+            "duration": 0.7,
+            "gap": 0.7,
+          },
+          {
+            "text": "ipsum",
+            "startTime": 0.7,
+            "endTime": 1.5,
+            "duration": 0.8,
+            "gap": 0.8,
+            "shouldKeep": True,
+          },
+        ],
+        "shouldKeep": True,
+      },
+      {
+        "text": "lorem",
+        "startTime": 3.2,
+        "endTime": 4,
+        "duration": 0.8,
+        "words": [
+          {
+            "text": "lorem",
+            "startTime": 3.2,
+            "endTime": 4,
+          },
+        ],
+      },
+      {
+        "text": "no words",
+        "startTime": 4,
+        "endTime": 5,
+        "duration": None,
+      },
+    ]
+
+  def test_round_trip_is_lossless(self):
+    compact = CompactTranscript.from_json(self.transcript)
+    self.assertEqual(compact.to_json(), self.transcript)
+
+  def test_columns(self):
+    compact = CompactTranscript.from_json(self.transcript)
+    self.assertEqual(compact.word_count, 3)
+    self.assertEqual(compact.line_count, 3)
+    self.assertEqual(list(compact.start_times), [0, 0.7, 3.2])
+    self.assertEqual(list(compact.end_times), [0.7, 1.5, 4])
+    self.assertEqual(list(compact.line_offsets), [0, 2, 3, 3])
+    self.assertEqual(compact.get_line_words(1), range(2, 3))
+
+  def test_texts_are_interned(self):
+    compact = CompactTranscript.from_json(self.transcript)
+    self.assertEqual(compact.texts, ["lorem", "ipsum"])
+    self.assertEqual(list(compact.text_ids), [0, 1, 0])
+    self.assertEqual(compact.get_text_id("ipsum"), 1)
+    self.assertEqual(compact.get_text_id("dolor"), -1)
+    self.assertEqual(compact.get_text(2), "lorem")
+
+  def test_from_words(self):
+    words = self.transcript[0]["words"] + self.transcript[1]["words"]
+    compact = CompactTranscript.from_words(words)
+    self.assertEqual(compact.line_count, 1)
+    self.assertEqual(compact.words_to_json(), words)
+    self.assertEqual(compact.words_to_json(1, 2), words[1:2])
+
+
+if __name__ == "__main__":
+  unittest.main()
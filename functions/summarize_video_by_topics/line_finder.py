@@ -0,0 +1,107 @@
+# Copyright 2023 Google LLC
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     https://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Locates the lines picked by the LLM in the words of the transcript.
+
+A line is found at the first word position from a start pointer where the
+words, joined by spaces, equal the line text. LineFinder answers this with
+an index from every word text to its sorted positions and a rolling hash of
+the word sequence: only positions that start with the first word of the
+line are visited, each one is compared in O(1), and the pointer of
+fix_timestamps only moves forward. Locating all lines is linear in the
+number of words overall.
+"""
+import bisect
+from compact_transcript import CompactTranscript
+
+_HASH_BASE = 1_000_003
+_HASH_MODULUS = (1 << 61) - 1
+
+
+class LineFinder:
+  """Finds line texts in a list of words."""
+
+  def __init__(self, words: list):
+    self._compact = CompactTranscript.from_words(words)
+    self._texts = [word["text"] for word in words]
+    # Positions of every text id, in increasing order.
+    self._positions = [[] for _ in self._compact.texts]
+    for position, text_id in enumerate(self._compact.text_ids):
+      self._positions[text_id].append(position)
+    # Texts with spaces can match a line across word boundaries, which the
+    # word level index cannot see, so such transcripts are scanned instead.
+    self._has_spaces = any(" " in text for text in self._compact.texts)
+
+    self._prefix_hashes = [0]
+    self._powers = [1]
+    for text_id in self._compact.text_ids:
+      self._prefix_hashes.append(
+          (self._prefix_hashes[-1] * _HASH_BASE + text_id + 1) % _HASH_MODULUS
+      )
+      self._powers.append(self._powers[-1] * _HASH_BASE % _HASH_MODULUS)
+
+  def _hash(self, start: int, stop: int) -> int:
+    return (self._prefix_hashes[stop]
+            - self._prefix_hashes[start] * self._powers[stop - start]
+            ) % _HASH_MODULUS
+
+  def matches(self, position: int, line_text: str) -> bool:
+    """Returns whether the line starts at the word position.
+
+    This is the check of the original word by word scan: the first word
+    matches regardless of case, and the joined words equal the line text.
+    """
+    tokens = line_text.split(" ")
+    if self._texts[position].lower() != tokens[0].lower():
+      return False
+    return line_text == " ".join(
+        self._texts[position:position + len(tokens)]
+    )
+
+  def find(self, line_text: str, start: int = 0) -> int:
+    """Returns the first position from start where the line matches.
+
+    Args:
+      line_text: The text of the line.
+      start: The position to search from.
+
+    Returns:
+      The word position of the line, or the number of words if the line is
+      not found after start.
+    """
+    word_count = len(self._texts)
+    if self._has_spaces:
+      position = start
+      while position < word_count and not self.matches(position, line_text):
+        position += 1
+      return position
+
+    tokens = line_text.split(" ")
+    text_ids = [self._compact.get_text_id(token) for token in tokens]
+    if -1 in text_ids:
+      return word_count
+    line_hash = 0
+    for text_id in text_ids:
+      line_hash = (line_hash * _HASH_BASE + text_id + 1) % _HASH_MODULUS
+
+    positions = self._positions[text_ids[0]]
+    for index in range(bisect.bisect_left(positions, start), len(positions)):
+      position = positions[index]
+      stop = position + len(tokens)
+      if stop > word_count:
+        break
+      if (self._hash(position, stop) == line_hash
+          and self._texts[position:stop] == tokens):
+        return position
+    return word_count
@@ -0,0 +1,78 @@
+# Copyright 2023 Google LLC
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     https://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import random
+import unittest
+from line_finder import LineFinder
+
+VOCABULARY = ["the", "The", "pixel", "camera", "is", "new", "", "a b"]
+
+
+def legacy_find(transcript_words: list, line_text: str, word_ptr: int) -> int:
+  """The word by word scan of fix_timestamps before LineFinder."""
+
+  def does_word_match_transcript(word_idx: int):
+    if (
+        transcript_words[word_idx].get("text").lower()
+        != line_text.split(" ")[0].lower()
+    ):
+      return False
+
+    word_count = len(line_text.split(" "))
+    list_of_text = list(map(lambda line: line["text"], transcript_words))
+    return line_text == " ".join(list_of_text[word_idx : word_idx + word_count])
+
+  while word_ptr < len(transcript_words) and not does_word_match_transcript(
+      word_ptr
+  ):
+    word_ptr += 1
+  return word_ptr
+
+
+def make_line(rng: random.Random, texts: list) -> str:
+  if rng.random() < 0.2 or not texts:
+    return " ".join(rng.choices(VOCABULARY, k=rng.randint(1, 4)))
+  start = rng.randrange(len(texts))
+  return " ".join(texts[start:start + rng.randint(1, 6)])
+
+
+class LineFinderTest(unittest.TestCase):
+
+  def check_matches_legacy(self, vocabulary: list, seed: int):
+    rng = random.Random(seed)
+    for _ in range(300):
+      texts = rng.choices(vocabulary, k=rng.randint(0, 40))
+      words = [{"text": text} for text in texts]
+      line_finder = LineFinder(words)
+      word_ptr = expected_ptr = 0
+      for _ in range(rng.randint(1, 8)):
+        line_text = make_line(rng, texts)
+        expected_ptr = legacy_find(words, line_text, expected_ptr)
+        word_ptr = line_finder.find(line_text, word_ptr)
+        self.assertEqual(word_ptr, expected_ptr, (texts, line_text))
+
+  def test_matches_legacy_scan(self):
+    self.check_matches_legacy(VOCABULARY[:-1], 18)
+
+  def test_matches_legacy_scan_with_spaces_in_words(self):
+    self.check_matches_legacy(VOCABULARY, 19)
+
+  def test_case_sensitive_line(self):
+    words = [{"text": text} for text in ["the", "pixel", "The", "pixel"]]
+    self.assertEqual(LineFinder(words).find("The pixel"), 2)
+    self.assertEqual(LineFinder(words).find("THE pixel"), 4)
+
+
+if __name__ == "__main__":
+  unittest.main()
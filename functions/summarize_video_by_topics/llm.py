@@ -14,8 +14,11 @@
 
 """LLM Module to define LLM models, and generate prompts."""
 
+from model_registry import ModelRegistry
 from vertexai.preview.language_models import TextGenerationModel
 
+MODELS = ModelRegistry(TextGenerationModel.from_pretrained)
+
 
 def transform_sentences_to_dict(text: str, transcript: dict) -> dict:
   """Converts text to a dictionary to return to client side.
@@ -90,7 +93,8 @@ def send_transcript_to_llm(
   """
   # AdClip uses the default value for parameters
   # https://cloud.google.com/vertex-ai/docs/generative-ai/model-reference/text
-  model = TextGenerationModel.from_pretrained(model_name=model_name)
+  model = MODELS.get(model_name)
+  print(f"Model registry: {MODELS.get_stats()}")
   response = model.predict(text,
                            temperature=temperature,
                            max_output_tokens=max_output_tokens,
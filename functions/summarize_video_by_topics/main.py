@@ -23,13 +23,16 @@ This function is the microservice to process the following tasks:
   - Returns each sentence in the "shortened transcript" with its video shot
 """
 
+from concurrent import futures
 import itertools
 import re
 
 from firebase_admin import firestore
 from firebase_admin import initialize_app
 from firebase_functions import https_fn
+from line_finder import LineFinder
 import llm
+from shot_index import ShotIndex
 
 
 LANGUAGE_CODE = "en-US"
@@ -57,20 +60,23 @@ def match_with_video_shots(video_shots: list,
   Returns:
     The transcript with the adjusted startTime and endTime.
   """
+  # Lines past the last shot snap to the end of the transcript.
+  end_times = [line["endTime"] for line in transcript] + [
+      word["endTime"] for word in words[-1:]
+  ]
+  shots = ShotIndex(video_shots, max(end_times, default=None))
   shot_index = 0
   word_index = 0
   for index, line in enumerate(transcript):
-    while video_shots[shot_index]["end_time"] < line["startTime"]:
-      shot_index += 1
-    video_shot = video_shots[shot_index]
+    shot_index = shots.find_ending_at_or_after(line["startTime"], shot_index)
+    video_shot = shots.get(shot_index)
 
     start_time = min(line["startTime"], video_shot["start_time"])
     transcript[index]["startTime"] = start_time
     print(f"start_time: {start_time}")
 
-    while video_shots[shot_index]["end_time"] < line["endTime"]:
-      shot_index += 1
-    video_shot = video_shots[shot_index]
+    shot_index = shots.find_ending_at_or_after(line["endTime"], shot_index)
+    video_shot = shots.get(shot_index)
 
     while (
         word_index < len(words) - 1
@@ -112,6 +118,10 @@ def get_clips_from_transcript(transcript: list,
     - Original sentence: "Pixel, the best in Google"s innovation"
     - Response from LLM: "Pixel is the best in Google"s innovation ..."
 
+  summarize_transcript_by_topic does not call this function: it locates the
+  lines the LLM returns with fix_timestamps. That is why the fuzzy alignment
+  of summarize_video is not offered here.
+
   Args:
     transcript: The original full transcripts
     summary: The "summarized" transcript from LLM
@@ -226,68 +236,47 @@ def fix_timestamps(
   list_of_words = list(map(lambda line: line["words"], input_transcript))
   transcript_words = list(itertools.chain.from_iterable(list_of_words))
 
+  shots = ShotIndex(video_shots)
+  line_finder = LineFinder(transcript_words)
   shot_index = 0
   word_ptr = 0
 
-  def does_word_match_transcript(word_idx: int, line: dict):
-    line_text = line.get("text")
-    if (
-        transcript_words[word_idx].get("text").lower()
-        != line_text.split(" ")[0].lower()
-    ):
-      return False
-
-    word_count = len(line_text.split(" "))
-    list_of_text = list(map(lambda line: line["text"], transcript_words))
-    return line_text == " ".join(list_of_text[word_idx : word_idx + word_count])
-
   corrected_lines = {}
   for line in shortened_list:
-    while word_ptr < len(transcript_words) and not does_word_match_transcript(
-        word_ptr, line
-    ):
-      word_ptr += 1
+    word_ptr = line_finder.find(line.get("text"), word_ptr)
 
     word_count = len(line.get("text").split(" "))
     if word_ptr + word_count < len(transcript_words):
       start_time = transcript_words[word_ptr]["startTime"]
       end_time = transcript_words[word_ptr + word_count]["endTime"]
 
-      while (
-          shot_index < len(video_shots)
-          and video_shots[shot_index]["end_time"] < start_time
-      ):
-        shot_index += 1
+      shot_index = shots.find_ending_at_or_after(start_time, shot_index)
 
-      if shot_index < len(video_shots):
+      if shot_index < len(shots):
         if word_ptr > 0:
           start_time = min(
               start_time,
               max(
                   transcript_words[word_ptr - 1]["endTime"],
-                  video_shots[shot_index]["start_time"],
+                  shots.get(shot_index)["start_time"],
               ),
           )
         else:
-          start_time = min(start_time, video_shots[shot_index]["start_time"])
+          start_time = min(start_time, shots.get(shot_index)["start_time"])
 
-      while (
-          shot_index < len(video_shots)
-          and video_shots[shot_index]["start_time"] < end_time
-      ):
-        shot_index += 1
+      shot_index = shots.find_starting_at_or_after(end_time, shot_index)
 
-      if shot_index < len(video_shots):
+      if shot_index < len(shots):
         if word_ptr < len(transcript_words) - 1:
           end_time = max(
               end_time,
               min(
                   transcript_words[word_ptr + 1]["startTime"],
-                  video_shots[shot_index]["end_time"],
+                  shots.get(shot_index)["end_time"],
               ),
           )
         else:
-          end_time = max(end_time, video_shots[shot_index]["end_time"])
+          end_time = max(end_time, shots.get(shot_index)["end_time"])
 
       line_number = line["lineNumber"]
       corrected_lines[line_number] = {
@@ -316,6 +305,50 @@ def fix_timestamps(
   return text_sorted_by_topics
 
 
+def send_topic_prompts(full_text: str,
+                       user_prompt: str,
+                       model_name: str) -> tuple[str, str, str]:
+  """Sends the three topic prompts to the LLM, overlapping their round trips.
+
+  The branding prompt does not depend on the other two, so it runs next to
+  the summary prompt. The match prompt needs the bullet points and is sent
+  as soon as the summary arrives, while the branding prompt may still be
+  running. This saves one LLM round trip compared to sending them in turn.
+
+  Args:
+    full_text: The transcript with line numbers.
+    user_prompt: The prompt that users may input on the UI.
+    model_name: The Language Model to use.
+
+  Returns:
+    The summary in bullet points, the branding sentences and the sentences
+    matched to the bullet points.
+  """
+  with futures.ThreadPoolExecutor(max_workers=2) as executor:
+    summary_future = executor.submit(
+        llm.send_transcript_to_llm,
+        text=llm.make_prompt_summarize(full_text, user_prompt),
+        model_name=model_name,
+    )
+    branding_future = executor.submit(
+        llm.send_transcript_to_llm,
+        text=llm.keep_branding_sentences(full_text),
+        temperature=0.1,
+        model_name=model_name,
+    )
+    summary_in_bullets = summary_future.result().strip(" ")
+    match_future = executor.submit(
+        llm.send_transcript_to_llm,
+        text=llm.make_prompt_match_sentence_to_bullet_points(
+            full_text, summary_in_bullets
+        ),
+        model_name=model_name,
+    )
+    branding_sentences = branding_future.result().strip()
+    matched_sentences = match_future.result().strip()
+  return summary_in_bullets, branding_sentences, matched_sentences
+
+
 @https_fn.on_call()
 def summarize_transcript_by_topic(request: https_fn.CallableRequest) -> any:
   """Receives input from a HTTP request and processes data.
@@ -358,26 +391,14 @@ def summarize_transcript_by_topic(request: https_fn.CallableRequest) -> any:
   print("=====video_shots======")
   print(video_shots)
 
-  summary_in_bullets = llm.send_transcript_to_llm(
-      text=llm.make_prompt_summarize(full_text, user_prompt),
-      model_name=model_name
-  ).strip(" ")
+  summary_in_bullets, branding_sentences, match_sentences_to_bullet_points = (
+      send_topic_prompts(full_text, user_prompt, model_name)
+  )
   print("----main-ideas-in-bullet-----")
   print(summary_in_bullets)
-
-  branding_sentences = llm.send_transcript_to_llm(
-      text=llm.keep_branding_sentences(full_text), temperature=0.1,
-      model_name=model_name
-  ).strip()
   print("----branding_sentences-----")
   print(branding_sentences)
 
-  match_sentences_to_bullet_points = llm.send_transcript_to_llm(
-      text=llm.make_prompt_match_sentence_to_bullet_points(
-          full_text, summary_in_bullets
-      ), model_name=model_name
-  ).strip()
-
   match_sentences_to_bullet_points += "\n" + "\n" + branding_sentences
   print("----match_sentences_to_bullet_points-----")
   print(match_sentences_to_bullet_points)
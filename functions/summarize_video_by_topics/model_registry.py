@@ -0,0 +1,86 @@
+# Copyright 2023 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Process-wide registry of model handles, keyed by model name.
+
+Loading a Vertex model resolves the publisher model and creates its
+prediction client, which costs a round trip before every prediction. A warm
+function instance keeps the registry between requests, so every model is
+loaded once per instance and its client and connections are reused.
+
+The same module is deployed with summarize_video and
+summarize_video_by_topics; keep the copies in sync.
+"""
+import threading
+import time
+from typing import Any, Callable
+
+
+class ModelRegistry:
+  """Loads models on first use and hands out the same handle afterwards."""
+
+  def __init__(self, load: Callable[[str], Any]):
+    """Initializes the registry.
+
+    Args:
+      load: Returns the model for a model name, e.g.
+        TextGenerationModel.from_pretrained.
+    """
+    self._load = load
+    self._models = {}
+    self._locks = {}
+    self._lock = threading.Lock()
+    self._loads = 0
+    self._hits = 0
+    self._load_seconds = 0.0
+
+  def get(self, model_name: str) -> Any:
+    """Returns the model, loading it if this is its first use.
+
+    Concurrent first calls for the same model wait for a single load.
+    """
+    with self._lock:
+      if model_name in self._models:
+        self._hits += 1
+        return self._models[model_name]
+      model_lock = self._locks.setdefault(model_name, threading.Lock())
+
+    with model_lock:
+      with self._lock:
+        if model_name in self._models:
+          self._hits += 1
+          return self._models[model_name]
+      start = time.perf_counter()
+      model = self._load(model_name)
+      elapsed = time.perf_counter() - start
+      with self._lock:
+        self._models[model_name] = model
+        self._loads += 1
+        self._load_seconds += elapsed
+      print(f'Loaded {model_name} in {elapsed:.3f}s')
+      return model
+
+  def get_stats(self) -> dict:
+    """Returns how often models were loaded and reused.
+
+    saved_seconds estimates the latency the reuse saved, as the number of
+    reuses times the average load time.
+    """
+    with self._lock:
+      average = self._load_seconds / self._loads if self._loads else 0
+      return {
+          'loads': self._loads,
+          'hits': self._hits,
+          'load_seconds': self._load_seconds,
+          'saved_seconds': self._hits * average,
+      }
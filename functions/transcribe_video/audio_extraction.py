@@ -0,0 +1,245 @@
+# Copyright 2023 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Audio-only extraction of the speech track with ffmpeg.
+
+The audio stream is demuxed without decoding any video, downmixed to mono
+and resampled to SAMPLE_RATE_HERTZ, which is all Speech-to-Text uses, and
+encoded as lossless FLAC. Inputs longer than two CHUNK_SECONDS are split
+into time chunks that are resampled on all cores and joined afterwards.
+
+For long recordings, the extracted audio can also be split at silences into
+chunks that are recognized separately, see get_split_points.
+"""
+from concurrent import futures
+import os
+import subprocess
+
+FFMPEG_BINARY = os.environ.get('FFMPEG_BINARY', 'ffmpeg')
+FFPROBE_BINARY = os.environ.get('FFPROBE_BINARY', 'ffprobe')
+SAMPLE_RATE_HERTZ = 16000
+CHANNEL_COUNT = 1
+# Length of the chunks of a parallel extraction, 0 disables chunking.
+CHUNK_SECONDS = int(os.environ.get('AUDIO_CHUNK_SECONDS', 600))
+MAX_WORKERS = os.cpu_count() or 1
+# Audio quieter than SILENCE_NOISE_DB for SILENCE_MIN_SECONDS is a silence.
+SILENCE_NOISE_DB = -30
+SILENCE_MIN_SECONDS = 0.3
+
+
+def run_ffmpeg(args: list) -> None:
+  """Runs ffmpeg with the given arguments and fails on a non-zero exit."""
+  subprocess.run(
+      [FFMPEG_BINARY, '-hide_banner', '-loglevel', 'error', '-y', *args],
+      check=True,
+  )
+
+
+def probe_duration(media_path: str) -> float:
+  """Returns the duration of the input in seconds."""
+  output = subprocess.run(
+      [
+          FFPROBE_BINARY, '-v', 'error',
+          '-show_entries', 'format=duration',
+          '-of', 'csv=p=0',
+          media_path,
+      ],
+      check=True,
+      capture_output=True,
+      text=True,
+  ).stdout
+  return float(output.strip() or 0)
+
+
+def get_chunks(duration: float, chunk_seconds: int = CHUNK_SECONDS) -> list:
+  """Splits the duration into (start_time, duration) chunks.
+
+  Returns a single chunk covering everything when chunking would not pay
+  off, i.e. it is disabled, the input is short or there is a single core.
+  """
+  if (not chunk_seconds or MAX_WORKERS < 2
+      or duration < 2 * chunk_seconds):
+    return [(0, None)]
+  chunks = []
+  start_time = 0
+  while start_time < duration:
+    chunks.append((start_time, chunk_seconds))
+    start_time += chunk_seconds
+  # The last chunk runs to the end, so no trailing samples are lost.
+  chunks[-1] = (chunks[-1][0], None)
+  return chunks
+
+
+def extract_chunk(
+    media_path: str,
+    output_path: str,
+    start_time: float = 0,
+    duration: float | None = None) -> None:
+  """Writes the resampled audio of a time range of the input."""
+  args = ['-ss', f'{start_time:.6f}'] if start_time else []
+  args += ['-i', media_path]
+  if duration is not None:
+    args += ['-t', f'{duration:.6f}']
+  run_ffmpeg([
+      *args,
+      '-vn', '-sn', '-dn',
+      '-map', '0:a:0',
+      '-ac', str(CHANNEL_COUNT),
+      '-ar', str(SAMPLE_RATE_HERTZ),
+      output_path,
+  ])
+
+
+def extract_audio(media_path: str, output_path: str) -> None:
+  """Extracts the mono 16 kHz audio of the input to output_path.
+
+  Args:
+    media_path: A local path of the video.
+    output_path: The path of the audio file, the extension selects the
+      codec, e.g. '.flac'.
+  """
+  chunks = get_chunks(probe_duration(media_path))
+  if len(chunks) == 1:
+    extract_chunk(media_path, output_path)
+    return
+
+  # Chunks are raw PCM so joining them does not add codec padding at seams.
+  base_path = os.path.splitext(output_path)[0]
+  chunk_paths = [
+      f'{base_path}_chunk_{index}.wav' for index in range(len(chunks))
+  ]
+  list_path = f'{base_path}_chunks.txt'
+  try:
+    with futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+      for future in [
+          executor.submit(extract_chunk, media_path, path, start, duration)
+          for path, (start, duration) in zip(chunk_paths, chunks)
+      ]:
+        future.result()
+
+    with open(list_path, 'w') as file:
+      for path in chunk_paths:
+        escaped_path = path.replace("'", "'\\''")
+        file.write(f"file '{escaped_path}'\n")
+    run_ffmpeg(['-f', 'concat', '-safe', '0', '-i', list_path, output_path])
+  finally:
+    for path in [*chunk_paths, list_path]:
+      if os.path.exists(path):
+        os.remove(path)
+
+
+def detect_silences(
+    audio_path: str,
+    noise_db: int = SILENCE_NOISE_DB,
+    min_duration: float = SILENCE_MIN_SECONDS) -> list:
+  """Finds the silent intervals of the audio with ffmpeg silencedetect.
+
+  Args:
+    audio_path: A local path of the audio.
+    noise_db: The level in dB below which the audio counts as silence.
+    min_duration: The shortest silence to report in seconds.
+
+  Returns:
+    A sorted list of (start_time, end_time) tuples in seconds.
+  """
+  output = subprocess.run(
+      [
+          FFMPEG_BINARY, '-hide_banner', '-nostats',
+          '-i', audio_path,
+          '-af', f'silencedetect=noise={noise_db}dB:d={min_duration}',
+          '-f', 'null', '-',
+      ],
+      check=True,
+      capture_output=True,
+      text=True,
+  ).stderr
+  return parse_silences(output)
+
+
+def parse_silences(output: str) -> list:
+  """Parses the silence_start and silence_end lines of silencedetect."""
+  silences = []
+  start_time = None
+  for line in output.splitlines():
+    if 'silence_start:' in line:
+      start_time = float(line.split('silence_start:')[1].split()[0])
+    elif 'silence_end:' in line and start_time is not None:
+      end_time = float(line.split('silence_end:')[1].split()[0])
+      silences.append((max(start_time, 0), end_time))
+      start_time = None
+  return silences
+
+
+def get_split_points(
+    duration: float, silences: list, chunk_seconds: float) -> list:
+  """Chooses where to split the audio into chunks of at most chunk_seconds.
+
+  Each chunk ends in the middle of the longest silence in the second half of
+  its window, so no word is cut in two. A window without silence is split
+  at its end.
+
+  Args:
+    duration: The duration of the audio in seconds.
+    silences: The sorted (start_time, end_time) silences of the audio.
+    chunk_seconds: The longest allowed chunk in seconds.
+
+  Returns:
+    The sorted split times in seconds, excluding 0 and duration.
+  """
+  split_points = []
+  start_time = 0
+  while duration - start_time > chunk_seconds:
+    window_start = start_time + chunk_seconds / 2
+    window_end = start_time + chunk_seconds
+    candidates = [
+        (silence_end - silence_start, (silence_start + silence_end) / 2)
+        for silence_start, silence_end in silences
+        if window_start < (silence_start + silence_end) / 2 <= window_end
+    ]
+    if candidates:
+      start_time = max(candidates)[1]
+    else:
+      start_time = window_end
+    split_points.append(start_time)
+  return split_points
+
+
+def split_audio(audio_path: str, split_points: list, output_path: str) -> list:
+  """Writes the chunks between the split points of the audio.
+
+  Args:
+    audio_path: A local path of the audio.
+    split_points: The sorted split times from get_split_points.
+    output_path: The chunks are written to this path with a _part_<index>
+      suffix before the extension.
+
+  Returns:
+    A list of (offset, chunk_path) tuples, offset is the start of the chunk
+    in the audio in seconds.
+  """
+  base_path, extension = os.path.splitext(output_path)
+  boundaries = [0, *split_points, None]
+  chunks = []
+  for index, start_time in enumerate(boundaries[:-1]):
+    end_time = boundaries[index + 1]
+    duration = None if end_time is None else end_time - start_time
+    chunks.append(
+        (start_time, f'{base_path}_part_{index}{extension}', duration)
+    )
+  with futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+    for future in [
+        executor.submit(extract_chunk, audio_path, path, start, duration)
+        for start, path, duration in chunks
+    ]:
+      future.result()
+  return [(start, path) for start, path, _ in chunks]
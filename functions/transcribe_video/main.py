@@ -12,15 +12,22 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from concurrent import futures
+import contextlib
 import itertools
 import os
+import uuid
 from firebase_admin import firestore
 from firebase_admin import initialize_app
 from firebase_functions import https_fn
 from firebase_functions import options
+from google.api_core import exceptions
 from google.cloud import speech
 from google.cloud import storage
-import moviepy.editor as mpy
+import audio_extraction
+import media_cache
+import segmentation
+from shot_index import ShotIndex
 from video_intelligence import process_video
 
 
@@ -33,7 +40,22 @@ TEMP_FOLDER = '/tmp/'
 GS_PATH = f'gs://{STORAGE_BUCKET}/'
 GAP_MULTIPLIER = 2.5
 MIN_CLIP_DURATION = 5
+SEGMENT_STRATEGY = os.environ.get(
+    'SEGMENT_STRATEGY', segmentation.STRATEGY_MEAN
+)
 LANGUAGE_CODE = 'en-US'
+# Bump when refine_by_video_shots, merge_clips or refine_by_gaps change, so
+# the derived transcripts stored in firestore are recomputed.
+DERIVED_TRANSCRIPT_VERSION = 1
+AUDIO_EXTENSION = '.flac'
+AUDIO_CHUNK_FOLDER = AUDIO_FOLDER + 'chunks/'
+RECOGNIZE_SINGLE = 'single'
+RECOGNIZE_CHUNKED = 'chunked'
+RECOGNIZE_MODE = os.environ.get('RECOGNIZE_MODE', RECOGNIZE_SINGLE)
+# The longest audio chunk sent to a single recognition in chunked mode.
+RECOGNIZE_CHUNK_SECONDS = int(os.environ.get('RECOGNIZE_CHUNK_SECONDS', 300))
+# The most writes firestore accepts in one batch.
+MAX_BATCH_WRITES = 500
 
 
 storage_client = storage.Client()
@@ -60,7 +82,9 @@ def get_speech_recognition_config(language_code: str):
     model = 'default'
   return speech.RecognitionConfig(
       enable_word_time_offsets=True,
-      audio_channel_count=2,  # 2 is default for wav files
+      # Extracted audio is downmixed to mono, see audio_extraction.
+      audio_channel_count=audio_extraction.CHANNEL_COUNT,
+      sample_rate_hertz=audio_extraction.SAMPLE_RATE_HERTZ,
       # Enable automatic punctuation
       # enable_automatic_punctuation=True,
       language_code=language_code,
@@ -95,6 +119,23 @@ def upload_blob(source_file_name: str, destination_blob_name: str) -> None:
   )
 
 
+def get_audio_file(file_name: str, output_name: str = None) -> str:
+  """Returns the file name of the extracted audio of a video."""
+  if output_name is None:
+    return file_name.rsplit('.', 1)[0] + AUDIO_EXTENSION
+  return output_name + AUDIO_EXTENSION
+
+
+def extract_audio_file(
+    video_full_path: str, file_name: str, audio_output_path: str) -> None:
+  """Extracts the audio of the video in GCS to a local path."""
+  bucket = storage_client.get_bucket(STORAGE_BUCKET)
+  blob = bucket.blob(video_full_path)
+  suffix = os.path.splitext(file_name)[1]
+  with media_cache.cached_blob(blob, suffix) as tmp_file_path:
+    audio_extraction.extract_audio(tmp_file_path, audio_output_path)
+
+
 def extract_audio(video_full_path, file_name, output_name=None) -> str:
   """Extract audio from the video by the given video path.
 
@@ -106,36 +147,34 @@ def extract_audio(video_full_path, file_name, output_name=None) -> str:
   Returns:
     A path to video audio file.
   """
-  bucket = storage_client.get_bucket(STORAGE_BUCKET)
-  file_name_without_extension = file_name.rsplit('.', 1)[0]
-  if output_name is None:
-    audio_output_file = file_name_without_extension  + '.wav'
-  else:
-    audio_output_file = output_name + '.wav'
+  audio_output_file = get_audio_file(file_name, output_name)
   gcs_file_path = AUDIO_FOLDER + audio_output_file
 
   if does_file_exist(gcs_file_path):
     print('File {} exists'.format(gcs_file_path))
     return GS_PATH + gcs_file_path
-  tmp_file_path = TEMP_FOLDER + file_name
 
-  # use video file_path
-  blob = bucket.blob(video_full_path)
-  blob.download_to_filename(tmp_file_path)
-  clip = mpy.VideoFileClip(tmp_file_path)
   audio_output_path = TEMP_FOLDER + audio_output_file
-  clip.audio.write_audiofile(audio_output_path)
+  extract_audio_file(video_full_path, file_name, audio_output_path)
 
   upload_blob(audio_output_path, gcs_file_path)
+  os.remove(audio_output_path)
 
   return GS_PATH + gcs_file_path
 
 
-def build_transcript(response) -> list:
+def build_transcript(
+    response,
+    offset: float = 0,
+    last_end_time: float = 0) -> list:
   """Build video transcript response with transcript metadata.
 
   Args:
     response: A transcript response from speech API.
+    offset: The start of the recognized audio in the video in seconds, added
+      to every timestamp of the response.
+    last_end_time: The end time of the word before the recognized audio,
+      used for the gap of its first word.
 
   Returns:
     A list of new video transcript strucutre and metadata.
@@ -163,8 +202,12 @@ def build_transcript(response) -> list:
       }
     ]
   """
+  def to_seconds(time_offset) -> float:
+    # Rounded the same with or without an offset, so a chunked recognition
+    # yields the same timestamps as a single one.
+    return round(time_offset.total_seconds() + offset, 3)
+
   transcript_builder = []
-  last_end_time = 0
   # Each result is for a consecutive portion of the audio. Iterate through
   # them to get the transcripts for the entire audio file.
   for result in response.results:
@@ -174,22 +217,22 @@ def build_transcript(response) -> list:
       if len(alternative.words) > 0:
         transcript_item = {
             'text': alternative.transcript,
-            'startTime': alternative.words[0].start_time.total_seconds(),
-            'endTime': alternative.words[-1].end_time.total_seconds(),
-            'duration': (alternative.words[-1].end_time.total_seconds()
-                         - alternative.words[0].start_time.total_seconds())
+            'startTime': to_seconds(alternative.words[0].start_time),
+            'endTime': to_seconds(alternative.words[-1].end_time),
+            'duration': (to_seconds(alternative.words[-1].end_time)
+                         - to_seconds(alternative.words[0].start_time))
         }
 
         transcript_item['words'] = []
         for word in alternative.words:
           transcript_item['words'].append({
               'text': word.word,
-              'startTime': word.start_time.total_seconds(),
-              'endTime': word.end_time.total_seconds(),
-              'duration': (word.end_time.total_seconds()
-                           - word.start_time.total_seconds()),
-              'gap': word.end_time.total_seconds() - last_end_time})
-          last_end_time = word.end_time.total_seconds()
+              'startTime': to_seconds(word.start_time),
+              'endTime': to_seconds(word.end_time),
+              'duration': (to_seconds(word.end_time)
+                           - to_seconds(word.start_time)),
+              'gap': to_seconds(word.end_time) - last_end_time})
+          last_end_time = to_seconds(word.end_time)
         transcript_builder.append(transcript_item)
   return transcript_builder
 
@@ -209,25 +252,10 @@ def generate_transcript_item(
 
 
 def refine_by_gaps(transcript: list) -> list:
-  """Refines the transcript by the gap time."""
-  new_transcript = []
-
-  for line in transcript:
-    gaps = list(map(lambda clip: clip['gap'], line['words']))
-    gaps.pop(0) #remove first gap
-
-    if len(gaps) == 0:
-      continue
-    average = sum(gaps) / len(gaps)
-    words = []
-    for index, word in enumerate(line['words']):
-      if index > 1 and word['gap'] > average * GAP_MULTIPLIER:
-        new_transcript.append(generate_transcript_item(words))
-        words = []
-      words.append(word)
-    if len(words) > 0:
-      new_transcript.append(generate_transcript_item(words))
-  return new_transcript
+  """Refines the transcript by the gap time, see segmentation."""
+  return segmentation.refine_by_gaps(
+      transcript, SEGMENT_STRATEGY, GAP_MULTIPLIER
+  )
 
 
 def upload_video_shots(file_name: str, video_shots: list) -> None:
@@ -235,6 +263,10 @@ def upload_video_shots(file_name: str, video_shots: list) -> None:
   db = firestore.client()
   doc_ref = db.collection('video_shots').document(file_name)
   doc_ref.set({'data': video_shots})
+  # The derived transcripts were refined with the previous shots.
+  db.collection('transcripts').document(file_name).set(
+      {'derived': firestore.DELETE_FIELD}, merge=True
+  )
 
 
 def get_video_shots(file_name: str) -> bool:
@@ -289,29 +321,35 @@ def merge_clips(transcript: list) -> list:
   return output
 
 
-def refine_by_video_shots(
-    file_name: str, video_gcs_uri: str, transcript: list) -> list:
-  """Refines transcript with video shots data."""
-
-  new_transcript = []
+def load_video_shots(file_name: str, video_gcs_uri: str) -> list:
+  """Gets the video shots from firestore, detecting them on a miss."""
   video_shots = get_video_shots(file_name)
-
   if video_shots is None:
     video_shots = process_video(video_gcs_uri)
     upload_video_shots(file_name, video_shots)
+  return video_shots
+
 
+def refine_by_video_shots(video_shots: list, transcript: list) -> list:
+  """Refines transcript with video shots data."""
+
+  new_transcript = []
   video_shots_index = 0
   list_of_words = list(map(lambda line: line['words'], transcript))
   transcript_words = list(itertools.chain.from_iterable(list_of_words))
   print('\\\\\transcript_words////')
   print(transcript_words)
   words = []
+  if not transcript_words:
+    return new_transcript
+  shots = ShotIndex(video_shots, transcript_words[-1]['endTime'])
 
   for index, word in enumerate(transcript_words):
     words.append(word)
-    while video_shots[video_shots_index]['end_time'] <= words[0]['startTime']:
-      video_shots_index = video_shots_index + 1
-    video_shot = video_shots[video_shots_index]
+    video_shots_index = shots.find_ending_after(
+        words[0]['startTime'], video_shots_index
+    )
+    video_shot = shots.get(video_shots_index)
     if word['endTime'] > video_shot['end_time']:
       start_time = min(words[0]['startTime'], video_shot['start_time'])
       if index < len(transcript_words) - 1:
@@ -330,27 +368,27 @@ def refine_by_video_shots(
       words = []
   if len(words) > 0:
     start_time = min(
-        words[0]['startTime'], video_shots[video_shots_index]['start_time']
+        words[0]['startTime'], shots.get(video_shots_index)['start_time']
     )
     if len(new_transcript) > 0:
       previous_last_word = new_transcript[-1]['words'][-1]
       start_time = max(start_time, previous_last_word['endTime'])
 
-    end_time = max(word['endTime'], video_shots[video_shots_index]['end_time'])
+    end_time = max(word['endTime'], shots.get(video_shots_index)['end_time'])
     video_shots_index = video_shots_index + 1
     new_transcript.append(generate_transcript_item(words, start_time, end_time))
 
   return new_transcript
 
 
-def get_transcript(file_name: str) -> bool:
-  """Gets transcript from firestore by file name."""
+def get_transcript_document(file_name: str) -> dict:
+  """Gets the transcript document from firestore by file name."""
   db = firestore.client()
   doc = db.collection('transcripts').document(file_name).get()
   if not doc.exists:
-    return None
+    return {}
 
-  return doc.to_dict().get('original')
+  return doc.to_dict()
 
 
 def upload_transcript(file_name: str, transcript: list) -> None:
@@ -359,6 +397,218 @@ def upload_transcript(file_name: str, transcript: list) -> None:
   doc_ref.set({'original': transcript})
 
 
+def get_derived_parameters() -> str:
+  """Identifies the algorithm and the constants of the derived transcripts."""
+  return (f'v{DERIVED_TRANSCRIPT_VERSION}'
+          f'-gap{GAP_MULTIPLIER}-min{MIN_CLIP_DURATION}'
+          f'-{SEGMENT_STRATEGY}')
+
+
+def get_derived_transcripts(transcript_document: dict) -> dict | None:
+  """Returns the stored transcript and v1 variants if they are current.
+
+  The variants are current when they were derived with the parameters of
+  get_derived_parameters. A change of the video shots removes them, see
+  upload_video_shots, so the shots are not read on a warm request.
+  """
+  derived = transcript_document.get('derived')
+  if not derived or derived.get('parameters') != get_derived_parameters():
+    return None
+  return derived
+
+
+def upload_derived_transcripts(file_name: str, derived: dict) -> None:
+  """Stores the transcript and v1 variants next to the original transcript."""
+  db = firestore.client()
+  doc_ref = db.collection('transcripts').document(file_name)
+  try:
+    doc_ref.update({
+        'derived': {
+            'parameters': get_derived_parameters(),
+            'transcript': derived['transcript'],
+            'v1': derived['v1'],
+        }
+    })
+  except exceptions.GoogleAPICallError as e:
+    # E.g. the document would grow past the firestore size limit.
+    print(f'Derived transcripts of {file_name} are not stored: {e}')
+
+
+class TranscriptPageWriter:
+  """Streams a transcript to firestore while it is being built.
+
+  Every call writes the given lines, the transcript of one audio chunk, as
+  the next page of the pages subcollection of the transcript document, so
+  the client can show the beginning of the transcript before the
+  recognition is complete. The pages are deleted once the transcript is
+  stored.
+  """
+
+  def __init__(self, file_name: str):
+    self._db = firestore.client()
+    self._pages = self._db.collection('transcripts').document(
+        file_name).collection('pages')
+    # Pages of an interrupted earlier run.
+    self.delete()
+    self._index = 0
+
+  def delete(self) -> None:
+    """Deletes every page, in batches of up to MAX_BATCH_WRITES."""
+    pages = list(self._pages.list_documents())
+    for start in range(0, len(pages), MAX_BATCH_WRITES):
+      batch = self._db.batch()
+      for page in pages[start:start + MAX_BATCH_WRITES]:
+        batch.delete(page)
+      batch.commit()
+
+  def __call__(self, lines: list) -> None:
+    if not lines:
+      return
+    self._pages.document(f'{self._index:06d}').set(
+        {'index': self._index, 'lines': lines}
+    )
+    self._index += 1
+
+
+def recognize_speech(
+    video_full_path: str,
+    file_name: str,
+    language_code: str) -> list:
+  """Extracts the audio of the video and transcribes it with Speech-to-Text.
+
+  Args:
+    video_full_path: A full video path that store in GCS.
+    file_name: A file name for temp use.
+    language_code: A language code for transribing.
+
+  Returns:
+    The transcript built by build_transcript.
+  """
+  audio_gcs_uri = extract_audio(video_full_path, file_name)
+  print(f'Extracted audio is stored at {audio_gcs_uri}')
+
+  audio = speech.RecognitionAudio(uri=audio_gcs_uri)
+  client = speech.SpeechClient()
+
+  config = get_speech_recognition_config(language_code)
+
+  operation = client.long_running_recognize(config=config, audio=audio)
+
+  print("Waiting for operation to complete...")
+  response = operation.result(timeout=900)
+
+  return build_transcript(response)
+
+
+def stitch_transcripts(chunk_responses, page_writer=None) -> list:
+  """Joins the responses of consecutive audio chunks into one transcript.
+
+  Args:
+    chunk_responses: An iterable of (offset, response) tuples in audio
+      order. Each chunk is built as soon as it is yielded.
+    page_writer: An optional TranscriptPageWriter that receives the lines of
+      every chunk as one page.
+
+  Returns:
+    The transcript of the whole audio with absolute timestamps, the same as
+    build_transcript of a single recognition.
+  """
+  transcript = []
+  last_end_time = 0
+  for offset, response in chunk_responses:
+    chunk_transcript = build_transcript(response, offset, last_end_time)
+    if page_writer is not None:
+      page_writer(chunk_transcript)
+    if chunk_transcript:
+      last_end_time = chunk_transcript[-1]['words'][-1]['endTime']
+    transcript.extend(chunk_transcript)
+  return transcript
+
+
+def recognize_speech_chunked(
+    video_full_path: str,
+    file_name: str,
+    language_code: str,
+    page_writer=None) -> list:
+  """Transcribes the audio in chunks split at silences, in parallel.
+
+  Every chunk is a separate long running recognition, so long videos no
+  longer depend on a single operation finishing in time. A freshly
+  extracted audio is split locally before it is uploaded, and the local
+  and GCS names of the chunks are unique to the request.
+
+  Args:
+    video_full_path: A full video path that store in GCS.
+    file_name: A file name for temp use.
+    language_code: A language code for transribing.
+    page_writer: An optional TranscriptPageWriter to stream the lines to.
+
+  Returns:
+    The transcript built by stitch_transcripts.
+  """
+  audio_file = get_audio_file(file_name)
+  audio_full_path = AUDIO_FOLDER + audio_file
+  local_prefix = f'{TEMP_FOLDER}{uuid.uuid4().hex}_'
+  bucket = storage_client.get_bucket(STORAGE_BUCKET)
+
+  chunks = []
+  with contextlib.ExitStack() as stack:
+    if does_file_exist(audio_full_path):
+      audio_path = stack.enter_context(media_cache.cached_blob(
+          bucket.blob(audio_full_path), AUDIO_EXTENSION
+      ))
+    else:
+      audio_path = local_prefix + audio_file
+      extract_audio_file(video_full_path, file_name, audio_path)
+      # Uploaded once the chunks are cut, for later requests.
+      stack.callback(os.remove, audio_path)
+      stack.callback(upload_blob, audio_path, audio_full_path)
+    duration = audio_extraction.probe_duration(audio_path)
+    split_points = audio_extraction.get_split_points(
+        duration,
+        audio_extraction.detect_silences(audio_path),
+        RECOGNIZE_CHUNK_SECONDS,
+    )
+    if split_points:
+      chunks = audio_extraction.split_audio(
+          audio_path, split_points, local_prefix + audio_file
+      )
+
+  if not chunks:
+    return recognize_speech(video_full_path, file_name, language_code)
+
+  client = speech.SpeechClient()
+  config = get_speech_recognition_config(language_code)
+  operations = []
+  chunk_blobs = []
+  try:
+    for offset, chunk_path in chunks:
+      chunk_full_path = AUDIO_CHUNK_FOLDER + os.path.basename(chunk_path)
+      upload_blob(chunk_path, chunk_full_path)
+      os.remove(chunk_path)
+      chunk_blobs.append(bucket.blob(chunk_full_path))
+      audio = speech.RecognitionAudio(uri=GS_PATH + chunk_full_path)
+      operations.append(
+          (offset, client.long_running_recognize(config=config, audio=audio))
+      )
+
+    print(f'Waiting for {len(operations)} chunk operations to complete...')
+    # The chunks are awaited in order, so the pages of a chunk are written as
+    # soon as it and every chunk before it are recognized.
+    return stitch_transcripts(
+        ((offset, operation.result(timeout=900))
+         for offset, operation in operations),
+        page_writer,
+    )
+  finally:
+    # The chunks are only needed by the recognitions.
+    for chunk_blob in chunk_blobs:
+      try:
+        chunk_blob.delete()
+      except exceptions.NotFound:
+        pass
+
+
 @https_fn.on_call(
     timeout_sec=600,
     memory=options.MemoryOption.GB_4,
@@ -368,6 +618,12 @@ def upload_transcript(file_name: str, transcript: list) -> None:
 def transcribe_video(request: https_fn.CallableRequest) -> any:
   """Transcribes video audio and store the transcript in GCS.
 
+  With stream_pages set in the request data, the audio is recognized in
+  chunked mode and the lines of each chunk are written to
+  transcripts/<file_name>/pages as soon as it is recognized, see
+  TranscriptPageWriter. A single recognition completes all at once, so there
+  would be nothing to stream.
+
   Args:
     request: A request payload from API call.
 
@@ -378,6 +634,10 @@ def transcribe_video(request: https_fn.CallableRequest) -> any:
   video_full_path = request.data['full_path']
   file_name = request.data['file_name']
   language_code = request.data['language_code'] or LANGUAGE_CODE
+  recognize_mode = request.data.get('recognize_mode') or RECOGNIZE_MODE
+  stream_pages = request.data.get('stream_pages')
+  if stream_pages:
+    recognize_mode = RECOGNIZE_CHUNKED
 
   if video_full_path is None:
     return {
@@ -387,40 +647,47 @@ def transcribe_video(request: https_fn.CallableRequest) -> any:
         )
     }
 
-  transcript_in_firestore = get_transcript(file_name)
-  if transcript_in_firestore is not None:
-    return {
-        'transcript': merge_clips(
-            refine_by_video_shots(
-                file_name,
-                GS_PATH + video_full_path,
-                transcript_in_firestore)),
-        'original': transcript_in_firestore,
-        'v1': refine_by_gaps(transcript_in_firestore),
-    }
-
-  audio_gcs_uri = extract_audio(video_full_path, file_name)
-  print(f'Extracted audio is stored at {audio_gcs_uri}')
-
-  audio = speech.RecognitionAudio(uri=audio_gcs_uri)
-  client = speech.SpeechClient()
-
-  config = get_speech_recognition_config(language_code)
-
-  operation = client.long_running_recognize(config=config, audio=audio)
-
-  print("Waiting for operation to complete...")
-  response = operation.result(timeout=900)
+  transcript_document = get_transcript_document(file_name)
+  transcript = transcript_document.get('original')
+  if transcript is not None:
+    derived = get_derived_transcripts(transcript_document)
+    if derived is not None:
+      return {
+          'transcript': derived['transcript'],
+          'original': transcript,
+          'v1': derived['v1'],
+      }
+    video_shots = load_video_shots(file_name, GS_PATH + video_full_path)
+  else:
+    # Shot detection does not depend on the transcript, so it runs while
+    # the audio is extracted and recognized.
+    with futures.ThreadPoolExecutor(max_workers=1) as executor:
+      video_shots_future = executor.submit(
+          load_video_shots, file_name, GS_PATH + video_full_path
+      )
+      page_writer = TranscriptPageWriter(file_name) if stream_pages else None
+      if recognize_mode == RECOGNIZE_CHUNKED:
+        transcript = recognize_speech_chunked(
+            video_full_path, file_name, language_code, page_writer
+        )
+      else:
+        transcript = recognize_speech(
+            video_full_path, file_name, language_code
+        )
+      upload_transcript(file_name, transcript)
+      if page_writer is not None:
+        page_writer.delete()
+      video_shots = video_shots_future.result()
 
-  transcript = build_transcript(response)
-  upload_transcript(file_name, transcript)
+  derived = {
+      'transcript': merge_clips(
+          refine_by_video_shots(video_shots, transcript)),
+      'v1': refine_by_gaps(transcript)
+  }
+  upload_derived_transcripts(file_name, derived)
 
   return {
-      'transcript': merge_clips(
-          refine_by_video_shots(
-              file_name,
-              GS_PATH + video_full_path,
-              transcript)),
+      'transcript': derived['transcript'],
       'original': transcript,
-      'v1': refine_by_gaps(transcript)
+      'v1': derived['v1']
   }
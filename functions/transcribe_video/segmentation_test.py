@@ -0,0 +1,119 @@
+# Copyright 2023 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import random
+import unittest
+import segmentation
+
+
+def legacy_refine_by_gaps(transcript: list) -> list:
+  """The refine_by_gaps of transcribe_video before segmentation."""
+  new_transcript = []
+
+  for line in transcript:
+    gaps = list(map(lambda clip: clip['gap'], line['words']))
+    gaps.pop(0)
+
+    if len(gaps) == 0:
+      continue
+    average = sum(gaps) / len(gaps)
+    words = []
+    for index, word in enumerate(line['words']):
+      if index > 1 and word['gap'] > average * segmentation.GAP_MULTIPLIER:
+        new_transcript.append(segmentation.make_segment(words))
+        words = []
+      words.append(word)
+    if len(words) > 0:
+      new_transcript.append(segmentation.make_segment(words))
+  return new_transcript
+
+
+def make_transcript(rng: random.Random, line_count: int) -> list:
+  """Builds a transcript with the gaps computed like build_transcript."""
+  transcript = []
+  time = 0
+  last_end_time = 0
+  for _ in range(line_count):
+    words = []
+    for _ in range(rng.randint(1, 30)):
+      start_time = round(time + rng.choice([0, 0, 0.1, 0.3, 1.5]), 1)
+      end_time = round(start_time + rng.uniform(0.1, 0.9), 1)
+      words.append({
+          'text': rng.choice(['lorem', 'ipsum', 'dolor', 'sit', 'amet']),
+          'startTime': start_time,
+          'endTime': end_time,
+          'duration': end_time - start_time,
+          'gap': end_time - last_end_time,
+      })
+      time = last_end_time = end_time
+    transcript.append(segmentation.make_segment(words))
+  return transcript
+
+
+class RefineByGapsTest(unittest.TestCase):
+
+  def test_mean_strategy_matches_legacy(self):
+    rng = random.Random(16)
+    for _ in range(200):
+      transcript = make_transcript(rng, rng.randint(0, 10))
+      self.assertEqual(
+          segmentation.refine_by_gaps(transcript),
+          legacy_refine_by_gaps(transcript),
+      )
+
+  def test_single_word_lines_are_dropped(self):
+    transcript = make_transcript(random.Random(1), 5)
+    transcript[2]['words'] = transcript[2]['words'][:1]
+    segments = segmentation.refine_by_gaps(
+        transcript, segmentation.STRATEGY_SILENCE
+    )
+    self.assertNotIn(
+        transcript[2]['words'][0],
+        [word for segment in segments for word in segment['words']],
+    )
+
+  def test_silence_strategy_splits_at_pauses(self):
+    words = [
+        {'text': 'a', 'startTime': 0, 'endTime': 1, 'gap': 1},
+        {'text': 'b', 'startTime': 1, 'endTime': 2, 'gap': 1},
+        {'text': 'c', 'startTime': 2, 'endTime': 3, 'gap': 1},
+        {'text': 'd', 'startTime': 4, 'endTime': 5, 'gap': 2},
+    ]
+    segments = segmentation.refine_by_gaps(
+        [segmentation.make_segment(words)], segmentation.STRATEGY_SILENCE
+    )
+    self.assertEqual([segment['text'] for segment in segments], ['a b c', 'd'])
+
+  def test_median_strategy_ignores_outliers(self):
+    gaps = [0.5, 0.5, 0.5, 0.5, 2, 10]
+    words = []
+    for index, gap in enumerate(gaps):
+      words.append(
+          {'text': str(index), 'startTime': 0, 'endTime': 0, 'gap': gap}
+      )
+    transcript = [segmentation.make_segment(words)]
+    mean_segments = segmentation.refine_by_gaps(transcript)
+    median_segments = segmentation.refine_by_gaps(
+        transcript, segmentation.STRATEGY_MEDIAN
+    )
+    self.assertEqual(len(mean_segments), 2)
+    self.assertEqual(len(median_segments), 3)
+
+  def test_unknown_strategy(self):
+    with self.assertRaises(ValueError):
+      segmentation.refine_by_gaps([], 'unknown')
+
+
+if __name__ == '__main__':
+  unittest.main()